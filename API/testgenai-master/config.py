@@ -17,6 +17,8 @@ class Settings:
     azure_openai_api_key: str = os.environ.get("AZURE_OPENAI_API_KEY")
     azure_openai_deployment_name: str = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME")
     azure_openai_api_version: str = os.environ.get("AZURE_OPENAI_API_VERSION")
+    azure_openai_gpt4_deployment_name: str = os.environ.get("AZURE_OPENAI_GPT4_DEPLOYMENT_NAME", azure_openai_deployment_name)
+    azure_openai_gpt35_deployment_name: str = os.environ.get("AZURE_OPENAI_GPT35_DEPLOYMENT_NAME", azure_openai_deployment_name)
 
     # Model configuration
     model_to_use_main: str = os.environ.get("MODEL_TO_USE_MAIN", "GPT 4")
@@ -29,10 +31,29 @@ class Settings:
     # Production settings - LLM
     llm_timeout_seconds: int = int(os.environ.get("LLM_TIMEOUT_SECONDS", "60"))
     llm_max_retries: int = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+    llm_concurrency: int = int(os.environ.get("LLM_CONCURRENCY", "5"))
+    llm_max_backoff_seconds: float = float(os.environ.get("LLM_MAX_BACKOFF_SECONDS", "30"))
+    enable_single_pass_sql: bool = os.environ.get("ENABLE_SINGLE_PASS_SQL", "true").lower() == "true"
+    enable_llm_streaming: bool = os.environ.get("ENABLE_LLM_STREAMING", "true").lower() == "true"
+    enable_single_table_shortcut: bool = os.environ.get("ENABLE_SINGLE_TABLE_SHORTCUT", "true").lower() == "true"
+    single_table_distance_margin: float = float(os.environ.get("SINGLE_TABLE_DISTANCE_MARGIN", "0.25"))
 
     # Production settings - Caching
     enable_sql_caching: bool = os.environ.get("ENABLE_SQL_CACHING", "true").lower() == "true"
     cache_ttl_seconds: int = int(os.environ.get("CACHE_TTL_SECONDS", "3600"))
+    response_cache_dir: str = os.environ.get("RESPONSE_CACHE_DIR", "data/response_cache")
+    enable_question_canonicalization: bool = os.environ.get("ENABLE_QUESTION_CANONICALIZATION", "true").lower() == "true"
+    enable_llm_caching: bool = os.environ.get("ENABLE_LLM_CACHING", "true").lower() == "true"
+    llm_cache_ttl_seconds: int = int(os.environ.get("LLM_CACHE_TTL_SECONDS", "3600"))
+    llm_cache_max_size: int = int(os.environ.get("LLM_CACHE_MAX_SIZE", "10000"))
+    redis_url: str = os.environ.get("REDIS_URL")
+    llm_cache_dir: str = os.environ.get("LLM_CACHE_DIR", "data/llm_cache")
+    enable_semantic_llm_caching: bool = os.environ.get("ENABLE_SEMANTIC_LLM_CACHING", "false").lower() == "true"
+    semantic_cache_threshold: float = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    enable_semantic_response_caching: bool = os.environ.get("ENABLE_SEMANTIC_RESPONSE_CACHING", "false").lower() == "true"
+    semantic_response_cache_threshold: float = float(os.environ.get("SEMANTIC_RESPONSE_CACHE_THRESHOLD", "0.95"))
+    enable_semantic_sql_caching: bool = os.environ.get("ENABLE_SEMANTIC_SQL_CACHING", "false").lower() == "true"
+    semantic_sql_cache_threshold: float = float(os.environ.get("SEMANTIC_SQL_CACHE_THRESHOLD", "0.95"))
 
     # Production settings - Validation
     enable_query_validation: bool = os.environ.get("ENABLE_QUERY_VALIDATION", "true").lower() == "true"
@@ -1,2 +1,2 @@
-from .prompts import get_ms_sql_prompt, get_ms_sql_prompt_for_follow_up, get_additional_insights_question_generation_prompt, get_related_questions_generation_prompt, get_sql_error_resolve_prompt 
-from .llm_core import get_llm_response, format_db_output, get_chart_image, get_edited_chart
\ No newline at end of file
+from .prompts import get_ms_sql_prompt, get_ms_sql_prompt_for_follow_up, get_additional_insights_question_generation_prompt, get_related_questions_generation_prompt, get_sql_error_resolve_prompt, reload_knowledge_base
+from .llm_core import get_llm_response, aget_llm_response, format_db_output, aformat_db_outputs, get_chart_image, get_edited_chart
\ No newline at end of file
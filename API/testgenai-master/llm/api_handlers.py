@@ -130,7 +130,7 @@ def original_question_response(question_id, question_type, query, vector_store_f
                 doc_contents.append(doc.metadata["metadata"])
 
         if not doc_contents:
-            return None, "<p>Unable to find relevant documentation for this question.</p>", False, 0, 0
+            return None, "<p>Unable to find relevant documentation for this question.</p>", False, 0, 0, False
 
         combined_docs = " \n\n ".join(doc_contents)
         prompt = f"Answer only the user question in HTML format - {query} - using this documentation - {combined_docs}"
@@ -139,7 +139,7 @@ def original_question_response(question_id, question_type, query, vector_store_f
 
         formatted_output = remove_specific_html_elements(initial_output)
 
-        return None, formatted_output, False, 0, 0
+        return None, formatted_output, False, 0, 0, False
 
     attempt_number = 1
     found_matching_sql = False
@@ -162,7 +162,7 @@ def original_question_response(question_id, question_type, query, vector_store_f
 
         if not extracted_sql or 'SQL Extraction Failed' in str(extracted_sql):
             logger.error(f"Two-stage SQL generation failed: {extracted_sql}")
-            return None, "I encountered an error generating the SQL query. Please try again.", False, 0, 0
+            return None, "I encountered an error generating the SQL query. Please try again.", False, 0, 0, False
 
         # Get tables for logging
         relevant_schemas = schema_intel.get_relevant_schemas(query, top_k=5)
@@ -183,7 +183,8 @@ def original_question_response(question_id, question_type, query, vector_store_f
                 question_id,
                 question_type,
                 query,
-                model_to_use
+                model_to_use,
+                relevant_schemas=relevant_schemas
             )
             logger.info(f"SQL fix attempt {attempt_number} - Valid: {is_valid}, Message: {fix_msg}")
 
@@ -197,7 +198,7 @@ def original_question_response(question_id, question_type, query, vector_store_f
         db_response, has_too_many_rows, too_many_rows_note = handle_too_many_rows(db_response, db_error)
 
     if db_error:
-        return None, db_error, found_matching_sql, 0, 0
+        return None, db_error, found_matching_sql, 0, 0, True
 
     formatted_output = format_db_output(question_id, question_type, db_response, query, "Original-Answer-Output-Formatting")
 
@@ -210,7 +211,7 @@ def original_question_response(question_id, question_type, query, vector_store_f
         if resultset_rows_count >= 5 and resultset_rows_count <= 30:
             show_chart = 1
 
-    return extracted_sql, formatted_output, found_matching_sql, show_chart, 1
+    return extracted_sql, formatted_output, found_matching_sql, show_chart, 1, False
     
 
 def additional_insights_response(question_id, question_type, query, vector_store_from_metadata, create_statement_dict, model_to_use):
@@ -247,7 +248,7 @@ def additional_insights_response(question_id, question_type, query, vector_store
 
     if not extracted_sql or 'SQL Extraction Failed' in str(extracted_sql):
         logger.info(f"Additional insights SQL generation failed for question_id: {question_id}")
-        return None, "<p>Unable to generate additional insights for this question. The insight may require data not available in the current schema.</p>"
+        return None, "<p>Unable to generate additional insights for this question. The insight may require data not available in the current schema.</p>", False
 
     db_response, _, db_error = execute_query_original(question_id, question_type, "Additional-Insights-SQL-Query-Generation", extracted_sql, True, attempt_number)
 
@@ -273,14 +274,14 @@ def additional_insights_response(question_id, question_type, query, vector_store
             db_response, has_too_many_rows, too_many_rows_note = handle_too_many_rows(db_response, db_error)
 
     if db_error:
-        return None, db_error
+        return None, db_error, True
 
     formatted_output = format_db_output(question_id, question_type, db_response, query_add, "Additional-Insights-Output-Formatting")
 
     if has_too_many_rows:
         formatted_output = too_many_rows_note + formatted_output
 
-    return extracted_sql, formatted_output
+    return extracted_sql, formatted_output, False
 
 
 
@@ -344,14 +345,14 @@ def followup_question_response(question_id, question_type, parent_question_id, q
                 doc_contents.append(doc.metadata["metadata"])
 
         if not doc_contents:
-            return None, "<p>Unable to find relevant documentation for this question.</p>", 0, 0
+            return None, "<p>Unable to find relevant documentation for this question.</p>", 0, 0, False
 
         combined_docs = " \n\n ".join(doc_contents)
 
         prompt_final = f"Answer only the user question in HTML format using the provide documentation. [Current Question]{query}[Current Question]. [Documenation]{combined_docs}[/Documenation]"
         initial_output, _ = get_llm_response(question_id, question_type, prompt_final, "GPT 3.5 0125", "RAG-Response-Generation-Follow-Up-Question", None, None, None, None, False)
         formatted_output = remove_specific_html_elements(initial_output)
-        return None, formatted_output, 0, 0
+        return None, formatted_output, 0, 0, False
 
     # Initialize schema intelligence for FAISS-based retrieval and validation
     schema_intel = get_schema_intelligence(create_statement_dict)
@@ -408,7 +409,7 @@ IMPORTANT: This is a FOLLOW-UP question. The user is asking about the same data
     logger.info(f"Follow-up SQL result - Valid: {is_valid}, Message: {validation_msg}")
 
     if not extracted_sql or 'SQL Extraction Failed' in str(extracted_sql):
-        return None, "I couldn't generate a valid SQL query for this follow-up question.", 0, 0
+        return None, "I couldn't generate a valid SQL query for this follow-up question.", 0, 0, False
 
     db_response, _, db_error = execute_query_original(question_id, question_type, "Original-Answer-SQL-Query-Generation", extracted_sql, True, attempt_number)
 
@@ -433,7 +434,7 @@ IMPORTANT: This is a FOLLOW-UP question. The user is asking about the same data
             db_response, has_too_many_rows, too_many_rows_note = handle_too_many_rows(db_response, db_error)
 
     if db_error:
-        return None, db_error, 0, 0
+        return None, db_error, 0, 0, True
 
     formatted_output = format_db_output(question_id, question_type, db_response, query, "Original-Answer-Output-Formatting")
 
@@ -446,7 +447,7 @@ IMPORTANT: This is a FOLLOW-UP question. The user is asking about the same data
         if resultset_rows_count >= 5 and resultset_rows_count <= 30:
             show_chart = 1
 
-    return extracted_sql, formatted_output, show_chart, 1
+    return extracted_sql, formatted_output, show_chart, 1, False
 
 
 def get_tags(question_id):
@@ -13,6 +13,9 @@ logger = logging.getLogger(__name__)
 # Thread pool for running sync functions in async context
 _executor = ThreadPoolExecutor(max_workers=10)
 
+# Separate pool for short DB reads/writes so they never queue behind long LLM calls
+_db_executor = ThreadPoolExecutor(max_workers=20)
+
 
 async def run_in_executor(func, *args, **kwargs):
     """Run a synchronous function in the thread pool executor."""
@@ -21,6 +24,13 @@ async def run_in_executor(func, *args, **kwargs):
     return await loop.run_in_executor(_executor, partial_func)
 
 
+async def run_db_in_executor(func, *args, **kwargs):
+    """Run a synchronous database call in the DB thread pool executor."""
+    loop = asyncio.get_event_loop()
+    partial_func = partial(func, *args, **kwargs)
+    return await loop.run_in_executor(_db_executor, partial_func)
+
+
 async def get_parallel_responses(
     question_id: str,
     question_type: str,
@@ -111,7 +121,7 @@ async def get_parallel_responses(
     # Process main response
     main_result = results.get("main")
     if main_result:
-        extracted_sql, formatted_output, found_matching_sql, show_chart, show_sql = main_result
+        extracted_sql, formatted_output, found_matching_sql, show_chart, show_sql, _ = main_result
 
         response = {
             "sql": extracted_sql,
@@ -172,7 +182,7 @@ async def get_additional_insights_async(
     )
 
     if result:
-        sql, answer = result
+        sql, answer, _ = result
         cache.set(query, {"sql": sql, "answer": answer}, "insights", ttl=3600)
         return sql, answer
 
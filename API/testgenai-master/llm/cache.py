@@ -0,0 +1,136 @@
+"""
+Exact-match cache for LLM completions.
+Responses are deterministic (temperature=0), so identical (model, prompt)
+pairs can be answered from cache without another Azure OpenAI round-trip.
+"""
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional
+
+from cachetools import TTLCache
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Relative cache directories resolve against the package, not the working directory
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LLMCache:
+    """
+    In-process TTL cache for LLM responses, backed by an optional Redis
+    and an optional on-disk tier that survives process restarts.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: int = 3600, redis_url: Optional[str] = None,
+                 disk_dir: Optional[str] = None):
+        """
+        Initialize cache.
+
+        Args:
+            maxsize: Maximum number of in-process entries
+            ttl: Time-to-live in seconds
+            redis_url: Optional Redis URL for a shared cache across workers
+            disk_dir: Optional directory for a persistent diskcache tier
+        """
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # TTLCache isn't thread-safe (get and set both touch its expiry list)
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        self._redis = None
+        self._disk = None
+
+        if disk_dir:
+            try:
+                import diskcache
+                self._disk = diskcache.Cache(disk_dir)
+            except Exception as e:
+                logger.warning(f"Persistent LLM cache unavailable at {disk_dir}: {e}")
+
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url)
+            except Exception as e:
+                logger.warning(f"Redis LLM cache unavailable, using in-process cache only: {e}")
+
+    @staticmethod
+    def cache_key(model: str, prompt: str) -> str:
+        """Generate a cache key from the model and prompt."""
+        return hashlib.sha256(f"{model}|{prompt}".encode()).hexdigest()
+
+    def get(self, model: str, prompt: str) -> Optional[str]:
+        """Get the cached response for a (model, prompt) pair, or None on miss."""
+        key = self.cache_key(model, prompt)
+
+        with self._lock:
+            response = self._cache.get(key)
+        if response is not None:
+            return response
+
+        if self._redis is not None:
+            try:
+                value = self._redis.get(f"llm:{key}")
+            except Exception as e:
+                logger.warning(f"Redis LLM cache read failed: {e}")
+                return None
+            if value is not None:
+                response = value.decode()
+                with self._lock:
+                    self._cache[key] = response
+                return response
+
+        if self._disk is not None:
+            try:
+                response = self._disk.get(key)
+            except Exception as e:
+                logger.warning(f"Persistent LLM cache read failed: {e}")
+                return None
+            if response is not None:
+                with self._lock:
+                    self._cache[key] = response
+                return response
+
+        return None
+
+    def set(self, model: str, prompt: str, response: str) -> None:
+        """Cache a response for a (model, prompt) pair."""
+        key = self.cache_key(model, prompt)
+        with self._lock:
+            self._cache[key] = response
+
+        if self._redis is not None:
+            try:
+                self._redis.setex(f"llm:{key}", self.ttl, response)
+            except Exception as e:
+                logger.warning(f"Redis LLM cache write failed: {e}")
+
+        if self._disk is not None:
+            try:
+                self._disk.set(key, response, expire=self.ttl)
+            except Exception as e:
+                logger.warning(f"Persistent LLM cache write failed: {e}")
+
+    def clear(self) -> None:
+        """Clear in-process and on-disk entries."""
+        with self._lock:
+            self._cache.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+
+# Global cache instance
+_llm_cache = LLMCache(
+    maxsize=settings.llm_cache_max_size,
+    ttl=settings.llm_cache_ttl_seconds,
+    redis_url=settings.redis_url,
+    disk_dir=os.path.join(_PACKAGE_DIR, settings.llm_cache_dir) if settings.llm_cache_dir else None
+)
+
+
+def get_llm_cache() -> LLMCache:
+    """Get the global LLM cache instance."""
+    return _llm_cache
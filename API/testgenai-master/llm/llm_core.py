@@ -1,27 +1,139 @@
 from abc import ABC, abstractmethod
-from langchain.chains import LLMChain
 from langchain_openai import AzureChatOpenAI
-from langchain.prompts import PromptTemplate
-from llm.prompts import get_output_format_prompt
+from langchain_core.messages import SystemMessage, HumanMessage
+from llm.prompts import get_output_format_prompt, OUTPUT_FORMAT_INSTRUCTIONS
+from llm.cache import get_llm_cache
+from llm.semantic_cache import get_semantic_cache, question_literals
+from llm.async_handlers import run_in_executor
+from llm.monitoring import metrics
 from config import settings
 from self_db.crud import log_exception
 from util.util import extract_sql_from_code_blocks
 from self_db import create_interaction
+import os
+import re
+import hashlib
 import time
+import atexit
+import httpx
+import openai
+import orjson
+import asyncio
 import logging
+from functools import lru_cache
 from openai import RateLimitError, APIError, Timeout
 
 logger = logging.getLogger(__name__)
 
+# Markdown code fences the model sometimes wraps formatted output in
+_MD_OPEN = re.compile(r'^```(?:html)?\s*', re.MULTILINE)
+_MD_CLOSE = re.compile(r'\s*```$', re.MULTILINE)
+
+
+# Connection pool shared by every Azure OpenAI client. Bounded so bursts
+# queue for a connection instead of exhausting sockets; idle keep-alive
+# connections are dropped after 30s.
+_HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30)
+_http_client = httpx.Client(limits=_HTTP_LIMITS, timeout=settings.llm_timeout_seconds)
+_http_async_client = httpx.AsyncClient(limits=_HTTP_LIMITS, timeout=settings.llm_timeout_seconds)
+
+
+@atexit.register
+def _close_http_clients():
+    _http_client.close()
+    try:
+        asyncio.run(_http_async_client.aclose())
+    except Exception as e:
+        logger.debug(f"Error closing async HTTP client: {e}")
+
+
+async def warm_llm_connections():
+    """
+    Open a connection to the Azure OpenAI endpoint on both shared HTTP clients
+    so the first user request doesn't pay for DNS and the TLS handshake.
+    """
+    if not settings.azure_openai_endpoint:
+        return
+    try:
+        await asyncio.gather(
+            _http_async_client.head(settings.azure_openai_endpoint),
+            run_in_executor(_http_client.head, settings.azure_openai_endpoint)
+        )
+        logger.info("Azure OpenAI connections warmed")
+    except Exception as e:
+        logger.warning(f"Failed to warm Azure OpenAI connections: {e}")
+
 
 class LLMStrategy(ABC):
     @abstractmethod
     def get_llm_qna_response(self):
         pass
 
+    @abstractmethod
+    async def aget_llm_qna_response(self):
+        pass
+
 
-class GPT4Strategy(LLMStrategy):
-    def get_llm_qna_response(self, prompt, max_retries=None):
+@lru_cache(maxsize=None)
+def _get_llm(deployment):
+    """Build the Azure OpenAI client once per deployment and reuse it."""
+    llm = AzureChatOpenAI(
+        azure_endpoint=settings.azure_openai_endpoint,
+        api_key=settings.azure_openai_api_key,
+        deployment_name=deployment,
+        api_version=settings.azure_openai_api_version,
+        temperature=0,
+        request_timeout=settings.llm_timeout_seconds
+    )
+    # The pinned langchain-openai passes a single http_client to both its sync and
+    # async OpenAI clients (and has no http_async_client), so the shared pools are
+    # attached by swapping in OpenAI clients built with the matching httpx client.
+    client_params = {
+        "azure_endpoint": settings.azure_openai_endpoint,
+        "api_key": settings.azure_openai_api_key,
+        "azure_deployment": deployment,
+        "api_version": settings.azure_openai_api_version,
+        "timeout": settings.llm_timeout_seconds,
+        "max_retries": llm.max_retries,
+    }
+    llm.client = openai.AzureOpenAI(http_client=_http_client, **client_params).chat.completions
+    llm.async_client = openai.AsyncAzureOpenAI(http_client=_http_async_client, **client_params).chat.completions
+    return llm
+
+
+def _get_messages(prompt, static_prefix):
+    if not static_prefix:
+        return prompt
+    # Static instructions go first as the system message so the provider
+    # can reuse its prompt cache across calls; the dynamic part follows.
+    return [SystemMessage(content=static_prefix), HumanMessage(content=prompt)]
+
+
+def _get_full_prompt(prompt, static_prefix):
+    """Prompt text as sent to the model, used for cache keys and interaction logs."""
+    return f"{static_prefix}\n\n{prompt}" if static_prefix else prompt
+
+
+def _get_retry_after(error, attempt):
+    """Seconds to wait before retrying a rate-limited call, from Azure's retry-after headers."""
+    delay = 2 ** attempt
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            delay = float(headers["retry-after-ms"]) / 1000
+        elif headers.get("retry-after"):
+            delay = float(headers["retry-after"])
+    except ValueError:
+        pass
+    return min(delay, settings.llm_max_backoff_seconds)
+
+
+class AzureStrategy(LLMStrategy):
+    def __init__(self, deployment):
+        self.deployment = deployment
+
+    def get_llm_qna_response(self, prompt, max_retries=None, static_prefix=None):
         """Get LLM response with retry logic and error handling"""
 
         if max_retries is None:
@@ -29,57 +141,43 @@ class GPT4Strategy(LLMStrategy):
 
         for attempt in range(max_retries):
             try:
-                prompt_template = """{question}"""
+                llm = _get_llm(self.deployment)
 
-                llm = AzureChatOpenAI(
-                    azure_endpoint=settings.azure_openai_endpoint,
-                    api_key=settings.azure_openai_api_key,
-                    deployment_name=settings.azure_openai_deployment_name,
-                    api_version=settings.azure_openai_api_version,
-                    temperature=0,
-                    request_timeout=settings.llm_timeout_seconds
-                )
-
-                llm_chain = LLMChain(
-                    llm=llm,
-                    prompt=PromptTemplate.from_template(prompt_template)
-                )
-
-                resp = llm_chain(prompt)
+                resp = llm.invoke(_get_messages(prompt, static_prefix))
 
                 # Validate response
-                if not resp or 'text' not in resp or not resp['text'].strip():
-                    logger.error(f"Empty LLM response on attempt {attempt + 1}")
+                if not resp or not resp.content or not resp.content.strip():
+                    logger.error("Empty LLM response on attempt %d", attempt + 1)
                     if attempt < max_retries - 1:
                         time.sleep(2 ** attempt)  # Exponential backoff
                         continue
                     return "Error: Unable to generate response. Please try rephrasing your question."
 
-                return resp['text']
+                return resp.content
 
             except Timeout as e:
-                logger.error(f"Timeout on attempt {attempt + 1}: {e}")
+                logger.error("Timeout on attempt %d: %s", attempt + 1, e)
                 if attempt < max_retries - 1:
                     time.sleep(2 ** attempt)
                     continue
                 return "Error: Request timed out. Please try again or simplify your question."
 
             except RateLimitError as e:
-                logger.error(f"Rate limit on attempt {attempt + 1}: {e}")
+                logger.error("Rate limit on attempt %d: %s", attempt + 1, e)
                 if attempt < max_retries - 1:
-                    time.sleep(5)  # Wait longer for rate limits
+                    time.sleep(_get_retry_after(e, attempt))
                     continue
                 return "Error: Too many requests. Please wait a moment and try again."
 
             except APIError as e:
-                logger.error(f"API error on attempt {attempt + 1}: {e}")
+                logger.error("API error on attempt %d: %s", attempt + 1, e)
                 if attempt < max_retries - 1:
                     time.sleep(2 ** attempt)
                     continue
                 return "Error: Azure OpenAI service error. Please try again."
 
             except Exception as e:
-                logger.error(f"Unexpected error on attempt {attempt + 1}: {e}", exc_info=True)
+                logger.error("Unexpected error on attempt %d: %s", attempt + 1, e, exc_info=True)
                 if attempt < max_retries - 1:
                     time.sleep(2 ** attempt)
                     continue
@@ -87,100 +185,224 @@ class GPT4Strategy(LLMStrategy):
 
         return "Error: Failed after maximum retries. Please contact support."
 
+    def stream_llm_qna_response(self, prompt, static_prefix=None, on_sql_block=None):
+        """
+        Stream an LLM response, calling on_sql_block(text_so_far) once, as soon as the
+        first ```sql block has closed, while the model is still generating.
+        Falls back to the retrying non-streaming call if the stream fails or is empty.
+        """
+        text = ""
+        sql_open = -1
+        try:
+            llm = _get_llm(self.deployment)
 
-class GPT35Strategy(LLMStrategy):
-    def get_llm_qna_response(self, prompt, max_retries=None):
-        """Get LLM response with retry logic and error handling"""
+            for chunk in llm.stream(_get_messages(prompt, static_prefix)):
+                piece = chunk.content
+                if not piece:
+                    continue
+                prev_len = len(text)
+                text += piece
+                if on_sql_block is None:
+                    continue
+
+                # Fences can straddle chunks, so rescan a few characters back
+                if sql_open < 0:
+                    tail_start = max(0, prev_len - 5)
+                    found = text[tail_start:].lower().find("```sql")
+                    if found < 0:
+                        continue
+                    sql_open = tail_start + found
+                if text.find("```", max(sql_open + 6, prev_len - 2)) >= 0:
+                    callback, on_sql_block = on_sql_block, None
+                    try:
+                        callback(text)
+                    except Exception as e:
+                        logger.warning("SQL block callback failed: %s", e)
+
+        except Exception as e:
+            logger.warning("Streaming LLM call failed, retrying without streaming: %s", e)
+            return self.get_llm_qna_response(prompt, static_prefix=static_prefix)
+
+        if not text.strip():
+            return self.get_llm_qna_response(prompt, static_prefix=static_prefix)
+
+        return text
+
+    async def aget_llm_qna_response(self, prompt, max_retries=None, static_prefix=None):
+        """Async variant of get_llm_qna_response that does not block the event loop"""
 
         if max_retries is None:
             max_retries = settings.llm_max_retries
 
         for attempt in range(max_retries):
             try:
-                prompt_template = """{question}"""
-
-                llm = AzureChatOpenAI(
-                    azure_endpoint=settings.azure_openai_endpoint,
-                    api_key=settings.azure_openai_api_key,
-                    deployment_name=settings.azure_openai_deployment_name,
-                    api_version=settings.azure_openai_api_version,
-                    temperature=0,
-                    request_timeout=settings.llm_timeout_seconds
-                )
-
-                llm_chain = LLMChain(
-                    llm=llm,
-                    prompt=PromptTemplate.from_template(prompt_template)
-                )
+                llm = _get_llm(self.deployment)
 
-                resp = llm_chain(prompt)
+                resp = await llm.ainvoke(_get_messages(prompt, static_prefix))
 
                 # Validate response
-                if not resp or 'text' not in resp or not resp['text'].strip():
-                    logger.error(f"Empty LLM response on attempt {attempt + 1}")
+                if not resp or not resp.content or not resp.content.strip():
+                    logger.error("Empty LLM response on attempt %d", attempt + 1)
                     if attempt < max_retries - 1:
-                        time.sleep(2 ** attempt)  # Exponential backoff
+                        await asyncio.sleep(2 ** attempt)  # Exponential backoff
                         continue
                     return "Error: Unable to generate response. Please try rephrasing your question."
 
-                return resp['text']
+                return resp.content
 
             except Timeout as e:
-                logger.error(f"Timeout on attempt {attempt + 1}: {e}")
+                logger.error("Timeout on attempt %d: %s", attempt + 1, e)
                 if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
+                    await asyncio.sleep(2 ** attempt)
                     continue
                 return "Error: Request timed out. Please try again or simplify your question."
 
             except RateLimitError as e:
-                logger.error(f"Rate limit on attempt {attempt + 1}: {e}")
+                logger.error("Rate limit on attempt %d: %s", attempt + 1, e)
                 if attempt < max_retries - 1:
-                    time.sleep(5)  # Wait longer for rate limits
+                    await asyncio.sleep(_get_retry_after(e, attempt))
                     continue
                 return "Error: Too many requests. Please wait a moment and try again."
 
             except APIError as e:
-                logger.error(f"API error on attempt {attempt + 1}: {e}")
+                logger.error("API error on attempt %d: %s", attempt + 1, e)
                 if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
+                    await asyncio.sleep(2 ** attempt)
                     continue
                 return "Error: Azure OpenAI service error. Please try again."
 
             except Exception as e:
-                logger.error(f"Unexpected error on attempt {attempt + 1}: {e}", exc_info=True)
+                logger.error("Unexpected error on attempt %d: %s", attempt + 1, e, exc_info=True)
                 if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
+                    await asyncio.sleep(2 ** attempt)
                     continue
                 return f"Error: {str(e)}"
 
         return "Error: Failed after maximum retries. Please contact support."
 
 
-# Create a dictionary mapping model names to LLM strategy classes
+# Create a dictionary mapping model names to LLM strategies
 llm_strategies = {
-    'GPT 4': GPT4Strategy(),
-    'GPT 3.5': GPT35Strategy(),
+    'GPT 4': AzureStrategy(settings.azure_openai_gpt4_deployment_name),
+    'GPT 3.5': AzureStrategy(settings.azure_openai_gpt35_deployment_name),
 }
 
+_default_strategy = llm_strategies['GPT 4']
+
+
+@lru_cache(maxsize=32)
+def _prefix_id(static_prefix):
+    """Short stable id for a static prompt prefix, hashed once per process."""
+    return hashlib.sha256(static_prefix.encode()).hexdigest()[:16] if static_prefix else ""
+
 
-def llm_qna_response(model_to_use, prompt):
-    llm_strategy = llm_strategies.get(model_to_use, GPT4Strategy())  # Default to GPT 4
-    return llm_strategy.get_llm_qna_response(prompt)
+def _semantic_cache_key(model_to_use, prompt, static_prefix, extract_sql, query):
+    """
+    (namespace, text) under which a get_llm_response call uses the semantic tier, or None.
+    Only SQL-generation prompts qualify: data-bearing prompts (output formatting, charts)
+    can embed nearly identically for different result sets.
+    Only the user question is embedded; the schema dump ahead of it would push it past the
+    embedder's input limit. The rest of the prompt (schema, errors) is hashed into the
+    namespace along with the question's literals, so both must match exactly.
+    """
+    if not (settings.enable_semantic_llm_caching and extract_sql == True
+            and static_prefix is not OUTPUT_FORMAT_INSTRUCTIONS):
+        return None
+    if not query or query not in prompt:
+        return None
+    context_hash = hashlib.sha256(prompt.replace(query, "").encode()).hexdigest()[:16]
+    namespace = f"{model_to_use}|{_prefix_id(static_prefix)}|{context_hash}|{question_literals(query)}"
+    return namespace, " ".join(query.split())
 
 
-def contains_table(llm_response, tables):
-    tables_list = tables.split(',')
-    for table in tables_list:
-        if table.strip().lower() in llm_response.lower():
-            return True
-    return False
+def _get_cached_llm_response(model_to_use, prompt, static_prefix=None, semantic_key=None):
+    """
+    Look up a prompt in the exact-match cache, then (given a semantic_key) the semantic cache.
+    The static prefix is represented by its id so only the dynamic part is hashed per lookup.
+    """
+    prefix_id = _prefix_id(static_prefix)
+    cache = get_llm_cache() if settings.enable_llm_caching else None
+    if cache is not None:
+        cached = cache.get(model_to_use, f"{prefix_id}|{prompt}")
+        metrics.record_llm_cache(cached is not None)
+        if cached is not None:
+            return cached
 
+    # Second tier: paraphrased questions under the same prefix, schema and literals.
+    # Hits are not copied into the exact tier, so a paraphrase never pins another prompt's answer.
+    if semantic_key is not None:
+        return get_semantic_cache().get(*semantic_key)
 
-def get_llm_response(question_id, question_type, prompt, model_name, usage_type, tables, db_schema, query, ms_sql_prompt, extract_sql):
-    start_time = time.time()
-    llm_response = llm_qna_response(model_name, prompt)
-    time_taken = time.time() - start_time
+    return None
+
+
+def _cache_llm_response(model_to_use, prompt, response, static_prefix=None, semantic_key=None):
+    """Store a successful LLM response in the enabled cache tiers."""
+    if response.startswith("Error"):
+        return
+    prefix_id = _prefix_id(static_prefix)
+    if settings.enable_llm_caching:
+        get_llm_cache().set(model_to_use, f"{prefix_id}|{prompt}", response)
+    if semantic_key is not None:
+        get_semantic_cache().set(*semantic_key, response)
+
+
+def llm_qna_response(model_to_use, prompt, static_prefix=None, semantic_key=None):
+    cached = _get_cached_llm_response(model_to_use, prompt, static_prefix, semantic_key)
+    if cached is not None:
+        return cached
+
+    llm_strategy = llm_strategies.get(model_to_use, _default_strategy)  # Default to GPT 4
+    response = llm_strategy.get_llm_qna_response(prompt, static_prefix=static_prefix)
+    _cache_llm_response(model_to_use, prompt, response, static_prefix, semantic_key)
+    return response
+
+
+def llm_qna_response_stream(model_to_use, prompt, static_prefix=None, on_sql_block=None, semantic_key=None):
+    """Streaming variant of llm_qna_response; cache hits return without calling on_sql_block."""
+    cached = _get_cached_llm_response(model_to_use, prompt, static_prefix, semantic_key)
+    if cached is not None:
+        return cached
+
+    llm_strategy = llm_strategies.get(model_to_use, _default_strategy)  # Default to GPT 4
+    response = llm_strategy.stream_llm_qna_response(prompt, static_prefix=static_prefix, on_sql_block=on_sql_block)
+    _cache_llm_response(model_to_use, prompt, response, static_prefix, semantic_key)
+    return response
+
+
+async def allm_qna_response(model_to_use, prompt, static_prefix=None, semantic_key=None):
+    cached = _get_cached_llm_response(model_to_use, prompt, static_prefix, semantic_key)
+    if cached is not None:
+        return cached
+
+    llm_strategy = llm_strategies.get(model_to_use, _default_strategy)  # Default to GPT 4
+    response = await llm_strategy.aget_llm_qna_response(prompt, static_prefix=static_prefix)
+    _cache_llm_response(model_to_use, prompt, response, static_prefix, semantic_key)
+    return response
+
+
+async def abatch_llm_qna_response(model_to_use, prompts, max_concurrent=None):
+    """Run several prompts concurrently, bounded by a semaphore."""
+    semaphore = asyncio.Semaphore(max_concurrent or settings.llm_concurrency)
+
+    async def _run(prompt):
+        async with semaphore:
+            return await allm_qna_response(model_to_use, prompt)
+
+    return await asyncio.gather(*(_run(prompt) for prompt in prompts))
+
+
+@lru_cache(maxsize=256)
+def _split_tables(tables):
+    return frozenset(table.strip().lower() for table in tables.split(','))
+
+
+def contains_table(llm_response, tables):
+    llm_response_lower = llm_response.lower()
+    return any(table in llm_response_lower for table in _split_tables(tables))
 
+
+def _record_llm_response(question_id, question_type, prompt, model_name, usage_type, tables, db_schema, query, ms_sql_prompt, extract_sql, llm_response, time_taken, return_raw_response=False):
     is_valid_question = True
 
     if extract_sql == True:
@@ -209,7 +431,8 @@ def get_llm_response(question_id, question_type, prompt, model_name, usage_type,
         except ValueError as e:
             return {"message": "Error while saving question", "error": str(e)}
 
-        return extracted_sql,  is_valid_question
+        # Callers that parse more than the SQL still get the full text; the extracted SQL is logged either way
+        return (llm_response if return_raw_response else extracted_sql), is_valid_question
     else:
         try:
             create_interaction(
@@ -232,19 +455,48 @@ def get_llm_response(question_id, question_type, prompt, model_name, usage_type,
         return llm_response, None
 
 
-def format_db_output(question_id, question_type, db_output, user_query, usage_type):
-    output_format_prompt = get_output_format_prompt(db_output, user_query)
-    formatted_output, is_valid_question = get_llm_response(
-        question_id, question_type, output_format_prompt,
-        settings.model_to_use_output_formatting, usage_type,
-        None, None, None, None, extract_sql=False
+def get_llm_response(question_id, question_type, prompt, model_name, usage_type, tables, db_schema, query, ms_sql_prompt, extract_sql, static_prefix=None, return_raw_response=False):
+    start_time = time.time()
+    llm_response = llm_qna_response(
+        model_name, prompt, static_prefix, _semantic_cache_key(model_name, prompt, static_prefix, extract_sql, query)
     )
+    time_taken = time.time() - start_time
+
+    return _record_llm_response(question_id, question_type, _get_full_prompt(prompt, static_prefix), model_name, usage_type, tables, db_schema, query, ms_sql_prompt, extract_sql, llm_response, time_taken, return_raw_response)
+
 
+def get_llm_response_stream(question_id, question_type, prompt, model_name, usage_type, tables, db_schema, query, ms_sql_prompt, extract_sql, static_prefix=None, on_sql_block=None, return_raw_response=False):
+    """get_llm_response over a streamed completion; see AzureStrategy.stream_llm_qna_response."""
+    start_time = time.time()
+    llm_response = llm_qna_response_stream(
+        model_name, prompt, static_prefix, on_sql_block,
+        _semantic_cache_key(model_name, prompt, static_prefix, extract_sql, query)
+    )
+    time_taken = time.time() - start_time
+
+    return _record_llm_response(question_id, question_type, _get_full_prompt(prompt, static_prefix), model_name, usage_type, tables, db_schema, query, ms_sql_prompt, extract_sql, llm_response, time_taken, return_raw_response)
+
+
+async def aget_llm_response(question_id, question_type, prompt, model_name, usage_type, tables, db_schema, query, ms_sql_prompt, extract_sql, static_prefix=None):
+    start_time = time.time()
+    llm_response = await allm_qna_response(
+        model_name, prompt, static_prefix, _semantic_cache_key(model_name, prompt, static_prefix, extract_sql, query)
+    )
+    time_taken = time.time() - start_time
+
+    # Interaction logging is a blocking DB write
+    return await run_in_executor(
+        _record_llm_response,
+        question_id, question_type, _get_full_prompt(prompt, static_prefix), model_name, usage_type,
+        tables, db_schema, query, ms_sql_prompt, extract_sql,
+        llm_response, time_taken
+    )
+
+
+def _clean_formatted_output(formatted_output):
     # Remove markdown code blocks if present
-    import re
-    formatted_output = re.sub(r'^```html\s*', '', formatted_output, flags=re.MULTILINE)
-    formatted_output = re.sub(r'^```\s*', '', formatted_output, flags=re.MULTILINE)
-    formatted_output = re.sub(r'\s*```$', '', formatted_output, flags=re.MULTILINE)
+    formatted_output = _MD_OPEN.sub('', formatted_output)
+    formatted_output = _MD_CLOSE.sub('', formatted_output)
     formatted_output = formatted_output.strip()
 
     # Replace newline characters with <br>
@@ -252,23 +504,87 @@ def format_db_output(question_id, question_type, db_output, user_query, usage_ty
     return formatted_output
 
 
-def get_chart_image(file_path):
+def format_db_output(question_id, question_type, db_output, user_query, usage_type):
+    output_format_prompt = get_output_format_prompt(db_output, user_query)
+    formatted_output, is_valid_question = get_llm_response(
+        question_id, question_type, output_format_prompt,
+        settings.model_to_use_output_formatting, usage_type,
+        None, None, None, None, extract_sql=False,
+        static_prefix=OUTPUT_FORMAT_INSTRUCTIONS
+    )
+    return _clean_formatted_output(formatted_output)
+
+
+async def aformat_db_outputs(items):
+    """
+    Format several database outputs concurrently.
+
+    Args:
+        items: List of (question_id, question_type, db_output, user_query, usage_type) tuples
+
+    Returns:
+        List of formatted outputs in the same order as items
+    """
+    semaphore = asyncio.Semaphore(settings.llm_concurrency)
+
+    async def _format(question_id, question_type, db_output, user_query, usage_type):
+        async with semaphore:
+            output_format_prompt = get_output_format_prompt(db_output, user_query)
+            formatted_output, is_valid_question = await aget_llm_response(
+                question_id, question_type, output_format_prompt,
+                settings.model_to_use_output_formatting, usage_type,
+                None, None, None, None, extract_sql=False,
+                static_prefix=OUTPUT_FORMAT_INSTRUCTIONS
+            )
+        return _clean_formatted_output(formatted_output)
+
+    return await asyncio.gather(*(_format(*item) for item in items))
+
+
+def _read_chart_data_head(file_path, nrows=5):
+    """
+    Read only the first rows of a chart data file.
+
+    Returns:
+        Tuple of (sample DataFrame, total row count)
+    """
     import pandas as pd
     import json
 
-    # Read the data
-    df = pd.read_csv(file_path) if file_path.endswith('.csv') else pd.read_json(file_path)
-
-    # Create data summary
-    data_summary = {
+    if file_path.endswith('.csv'):
+        df = pd.read_csv(file_path, nrows=nrows)
+        with open(file_path, 'rb') as f:
+            row_count = max(sum(1 for _ in f) - 1, 0)
+    else:
+        # Result sets are stored as a JSON array of records
+        with open(file_path, 'r') as f:
+            records = json.load(f)
+        df = pd.DataFrame(records[:nrows])
+        row_count = len(records)
+
+    return df, row_count
+
+
+@lru_cache(maxsize=64)
+def _file_summary(file_path, mtime):
+    """
+    Column names, sample rows, dtypes and row count of a chart data file.
+    Keyed on mtime so a rewritten file is summarized again; callers must not mutate the result.
+    """
+    df, row_count = _read_chart_data_head(file_path)
+    return {
         "columns": list(df.columns),
-        "sample_data": df.head(5).to_dict('records'),
+        "sample_data": df.to_dict('records'),
         "data_types": {col: str(dtype) for col, dtype in df.dtypes.items()},
-        "row_count": len(df)
+        "row_count": row_count
     }
 
+
+def get_chart_image(file_path):
+    data_summary = _file_summary(file_path, os.path.getmtime(file_path))
+
     # Use Azure OpenAI to generate chart config
-    prompt = f"""Given this data summary: {json.dumps(data_summary)}
+    prompt = f"""Given this data summary: {orjson.dumps(data_summary, option=orjson.OPT_SERIALIZE_NUMPY).decode()}
     Generate a Python dictionary for an ApexCharts configuration that best visualizes this data.
     Return only valid Python dictionary code, no markdown or explanation."""
 
@@ -278,17 +594,14 @@ def get_chart_image(file_path):
 
 
 def get_edited_chart(question_id, file_path, code, library, instructions):
-    import pandas as pd
-    import json
-
-    df = pd.read_csv(file_path) if file_path.endswith('.csv') else pd.read_json(file_path)
+    file_summary = _file_summary(file_path, os.path.getmtime(file_path))
     data_summary = {
-        "columns": list(df.columns),
-        "sample_data": df.head(5).to_dict('records')
+        "columns": file_summary["columns"],
+        "sample_data": file_summary["sample_data"]
     }
 
     prompt = f"""Given this existing chart code: {code}
-    And this data: {json.dumps(data_summary)}
+    And this data: {orjson.dumps(data_summary, option=orjson.OPT_SERIALIZE_NUMPY).decode()}
     Apply these instructions: {instructions}
     Return updated chart configuration as Python dictionary."""
 
@@ -1,8 +1,10 @@
 import logging
+import threading
 import time
+from collections import Counter
 from functools import wraps
 from typing import Any, Callable
-import json
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -10,42 +12,59 @@ logger = logging.getLogger(__name__)
 class QueryMetrics:
     """Track query generation metrics"""
 
+    COUNTERS = (
+        "total_queries",
+        "successful_queries",
+        "failed_queries",
+        "llm_errors",
+        "sql_extraction_failures",
+        "validation_failures",
+        "db_execution_errors",
+        "llm_cache_hits",
+        "llm_cache_misses"
+    )
+
     def __init__(self):
-        self.metrics = {
-            "total_queries": 0,
-            "successful_queries": 0,
-            "failed_queries": 0,
-            "total_time": 0,
-            "avg_time": 0,
-            "llm_errors": 0,
-            "sql_extraction_failures": 0,
-            "validation_failures": 0,
-            "db_execution_errors": 0
-        }
+        self._lock = threading.Lock()
+        self.metrics = Counter({name: 0 for name in self.COUNTERS})
+        self.total_time = 0.0
 
     def record_success(self, duration: float):
-        self.metrics["total_queries"] += 1
-        self.metrics["successful_queries"] += 1
-        self.metrics["total_time"] += duration
-        self.metrics["avg_time"] = self.metrics["total_time"] / self.metrics["total_queries"]
+        with self._lock:
+            self.metrics["total_queries"] += 1
+            self.metrics["successful_queries"] += 1
+            self.total_time += duration
 
     def record_failure(self, failure_type: str, duration: float):
-        self.metrics["total_queries"] += 1
-        self.metrics["failed_queries"] += 1
-        self.metrics["total_time"] += duration
-        if failure_type in self.metrics:
-            self.metrics[failure_type] += 1
+        with self._lock:
+            self.metrics["total_queries"] += 1
+            self.metrics["failed_queries"] += 1
+            self.total_time += duration
+            if failure_type != "failed_queries" and failure_type in self.metrics:
+                self.metrics[failure_type] += 1
+
+    def record_llm_cache(self, hit: bool):
+        with self._lock:
+            self.metrics["llm_cache_hits" if hit else "llm_cache_misses"] += 1
 
     def get_metrics(self) -> dict:
-        return self.metrics.copy()
+        with self._lock:
+            snapshot = dict(self.metrics)
+            snapshot["total_time"] = self.total_time
+        snapshot["avg_time"] = snapshot["total_time"] / max(snapshot["total_queries"], 1)
+        return snapshot
 
     def log_metrics(self):
-        logger.info(f"Query Metrics: {json.dumps(self.metrics, indent=2)}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Query Metrics: %s", orjson.dumps(self.get_metrics(), option=orjson.OPT_INDENT_2).decode())
 
 
 # Global metrics instance
 metrics = QueryMetrics()
 
+# Prefixes of the error strings returned in place of query output
+_ERROR_PREFIXES = ("Error",)
+
 
 def track_query_generation(func: Callable) -> Callable:
     """Decorator to track query generation metrics"""
@@ -56,27 +75,33 @@ def track_query_generation(func: Callable) -> Callable:
         question_id = kwargs.get("question_id", args[0] if args else "unknown")
 
         try:
-            logger.info(f"Starting query generation for question_id: {question_id}")
+            logger.info("Starting query generation for question_id: %s", question_id)
             result = func(*args, **kwargs)
 
             duration = time.time() - start_time
 
-            # Check if generation was successful
-            if result and len(result) >= 2:
-                sql, output = result[0], result[1]
-                if sql and not (isinstance(output, str) and output.startswith("Error")):
-                    metrics.record_success(duration)
-                    logger.info(f"Query generation successful in {duration:.2f}s for question_id: {question_id}")
-                else:
-                    metrics.record_failure("failed_queries", duration)
-                    logger.warning(f"Query generation failed in {duration:.2f}s for question_id: {question_id}")
+            # Error paths return a dict rather than a (sql, output, ...) tuple
+            if isinstance(result, dict):
+                metrics.record_failure("failed_queries", duration)
+                logger.warning("Query generation failed in %.2fs for question_id: %s", duration, question_id)
+                return result
+            if not isinstance(result, tuple) or len(result) < 2:
+                return result
+
+            sql, output = result[0], result[1]
+            if sql and not (isinstance(output, str) and output.startswith(_ERROR_PREFIXES)):
+                metrics.record_success(duration)
+                logger.info("Query generation successful in %.2fs for question_id: %s", duration, question_id)
+            else:
+                metrics.record_failure("failed_queries", duration)
+                logger.warning("Query generation failed in %.2fs for question_id: %s", duration, question_id)
 
             return result
 
         except Exception as e:
             duration = time.time() - start_time
             metrics.record_failure("failed_queries", duration)
-            logger.error(f"Query generation exception in {duration:.2f}s for question_id: {question_id}: {e}", exc_info=True)
+            logger.error("Query generation exception in %.2fs for question_id: %s: %s", duration, question_id, e, exc_info=True)
             raise
 
     return wrapper
@@ -84,18 +109,27 @@ def track_query_generation(func: Callable) -> Callable:
 
 def log_llm_call(question_id: str, prompt_length: int, response_length: int, duration: float, success: bool):
     """Log LLM API call details"""
-    logger.info(f"""LLM Call Summary:
-    Question ID: {question_id}
-    Prompt Length: {prompt_length} chars
-    Response Length: {response_length} chars
-    Duration: {duration:.2f}s
-    Success: {success}
-    Tokens Est: {(prompt_length + response_length) / 4:.0f}
-    """)
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    logger.info(
+        """LLM Call Summary:
+    Question ID: %s
+    Prompt Length: %s chars
+    Response Length: %s chars
+    Duration: %.2fs
+    Success: %s
+    Tokens Est: %.0f
+    """,
+        question_id, prompt_length, response_length, duration, success,
+        (prompt_length + response_length) / 4
+    )
 
 
 def log_sql_generation(question_id: str, question: str, sql: str, success: bool, error: str = None):
     """Log SQL generation details"""
+    if not logger.isEnabledFor(logging.INFO if success else logging.ERROR):
+        return
+
     log_data = {
         "question_id": question_id,
         "question": question[:200],  # Truncate for logging
@@ -105,6 +139,6 @@ def log_sql_generation(question_id: str, question: str, sql: str, success: bool,
     }
 
     if success:
-        logger.info(f"SQL Generated: {json.dumps(log_data)}")
+        logger.info("SQL Generated: %s", orjson.dumps(log_data).decode())
     else:
-        logger.error(f"SQL Generation Failed: {json.dumps(log_data)}")
+        logger.error("SQL Generation Failed: %s", orjson.dumps(log_data).decode())
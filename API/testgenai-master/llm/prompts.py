@@ -1,18 +1,37 @@
 
 from datetime import datetime
+from functools import lru_cache
 import json
 import os
 
+# Knowledge-base JSON files live in the top-level data/ directory
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+@lru_cache(maxsize=None)
+def _load_knowledge_base_file(filename):
+    """
+    Parse a JSON file from the data/ knowledge base once per process.
+    Errors propagate (and are not cached) so a missing file is retried on the next call.
+    """
+    with open(os.path.join(_DATA_DIR, filename), 'r') as f:
+        return json.load(f)
+
+
+def reload_knowledge_base():
+    """Drop the parsed knowledge-base files and every prompt built from them so the next call re-reads them from disk."""
+    _load_knowledge_base_file.cache_clear()
+    rebuild_core_rules_text()
+    _get_verified_query_examples.cache_clear()
+    get_ms_sql_prompt.cache_clear()
+    get_ms_sql_prompt_for_follow_up.cache_clear()
+    _error_resolve_prefix.cache_clear()
+
+
 def load_verified_queries():
     """Load verified working SQL queries from knowledge base"""
     try:
-        queries_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'data',
-            'verified_queries.json'
-        )
-        with open(queries_path, 'r') as f:
-            return json.load(f)
+        return _load_knowledge_base_file('verified_queries.json')
     except Exception as e:
         print(f"⚠️  WARNING: Could not load verified_queries.json: {e}")
         return {}
@@ -20,13 +39,7 @@ def load_verified_queries():
 def load_sql_generation_rules():
     """Load SQL generation rules from JSON knowledge base"""
     try:
-        rules_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'data',
-            'sql_generation_rules.json'
-        )
-        with open(rules_path, 'r') as f:
-            return json.load(f)
+        return _load_knowledge_base_file('sql_generation_rules.json')
     except Exception as e:
         print(f"⚠️  WARNING: Could not load sql_generation_rules.json: {e}")
         return {}
@@ -34,13 +47,7 @@ def load_sql_generation_rules():
 def load_business_logic_rules():
     """Load business logic rules from JSON knowledge base"""
     try:
-        rules_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'data',
-            'business_logic_rules.json'
-        )
-        with open(rules_path, 'r') as f:
-            return json.load(f)
+        return _load_knowledge_base_file('business_logic_rules.json')
     except Exception as e:
         print(f"⚠️  WARNING: Could not load business_logic_rules.json: {e}")
         return {}
@@ -51,15 +58,7 @@ def load_date_range_info():
     Returns dict with available years, months, quarters, and latest values.
     """
     try:
-        date_range_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'data',
-            'date_range.json'
-        )
-        with open(date_range_path, 'r') as f:
-            date_info = json.load(f)
-
-        return date_info
+        return _load_knowledge_base_file('date_range.json')
     except Exception as e:
         print(f"⚠️  CRITICAL WARNING: Could not load date_range.json: {e}")
         print(f"⚠️  Using HARDCODED fallback values. UPDATE date_range.json to fix this!")
@@ -73,7 +72,7 @@ def load_date_range_info():
         }
 
 
-def _get_core_sql_rules():
+def _build_core_rules_text():
     """Core SQL generation rules - loaded from knowledge base"""
     sql_rules = load_sql_generation_rules()
 
@@ -81,89 +80,108 @@ def _get_core_sql_rules():
         return "ERROR: Could not load SQL generation rules"
 
     # Build rules from JSON knowledge base
-    rules_text = "CORE RULES:\n"
+    parts = ["CORE RULES:\n"]
 
     # Generic syntax rules
     if 'generic_rules' in sql_rules:
         for category, rules in sql_rules['generic_rules'].items():
-            for rule in rules:
-                rules_text += f"• {rule}\n"
+            parts.extend(f"• {rule}\n" for rule in rules)
 
     # Date handling rules
     if 'date_handling' in sql_rules:
-        rules_text += "\nCRITICAL - DATE HANDLING:\n"
-        for rule in sql_rules['date_handling']['critical_rules']:
-            rules_text += f"❌ " if "NEVER" in rule else f"✅ "
-            rules_text += f"{rule}\n"
+        parts.append("\nCRITICAL - DATE HANDLING:\n")
+        parts.extend(
+            f"❌ {rule}\n" if "NEVER" in rule else f"✅ {rule}\n"
+            for rule in sql_rules['date_handling']['critical_rules']
+        )
 
         pattern = sql_rules['date_handling']['correct_pattern_for_date_filtering']
-        rules_text += f"\nCORRECT DATE PATTERN:\n{pattern['sql']}\n"
+        parts.append(f"\nCORRECT DATE PATTERN:\n{pattern['sql']}\n")
 
     # Common mistakes from knowledge base
     if 'common_mistakes' in sql_rules:
-        rules_text += "\nCOMMON MISTAKES TO AVOID:\n"
+        parts.append("\nCOMMON MISTAKES TO AVOID:\n")
 
         # Data type errors
         if 'data_type_errors' in sql_rules['common_mistakes']:
             dt_error = sql_rules['common_mistakes']['data_type_errors']
-            rules_text += f"❌ WRONG: {dt_error['wrong_pattern']}\n"
-            rules_text += f"✅ CORRECT: {dt_error['correct_pattern']}\n"
+            parts.append(f"❌ WRONG: {dt_error['wrong_pattern']}\n")
+            parts.append(f"✅ CORRECT: {dt_error['correct_pattern']}\n")
 
         # Datetime errors
         if 'datetime_overflow_errors' in sql_rules['common_mistakes']:
             dt_error = sql_rules['common_mistakes']['datetime_overflow_errors']
-            rules_text += f"❌ WRONG: {dt_error['wrong_pattern']}\n"
-            rules_text += f"✅ CORRECT: {dt_error['correct_pattern']}\n"
+            parts.append(f"❌ WRONG: {dt_error['wrong_pattern']}\n")
+            parts.append(f"✅ CORRECT: {dt_error['correct_pattern']}\n")
 
         # Column invention
         if 'column_invention' in sql_rules['common_mistakes']:
             col_error = sql_rules['common_mistakes']['column_invention']
-            rules_text += f"\nCRITICAL - COLUMN VALIDATION:\n{col_error['rule']}\n"
-            rules_text += "Common hallucinations:\n"
-            for hallucination in col_error['common_hallucinations']:
-                rules_text += f"  • {hallucination}\n"
+            parts.append(f"\nCRITICAL - COLUMN VALIDATION:\n{col_error['rule']}\n")
+            parts.append("Common hallucinations:\n")
+            parts.extend(f"  • {hallucination}\n" for hallucination in col_error['common_hallucinations'])
 
         # Table invention
         if 'table_invention' in sql_rules['common_mistakes']:
             table_error = sql_rules['common_mistakes']['table_invention']
-            rules_text += f"\nCRITICAL - TABLE VALIDATION:\n{table_error['rule']}\n"
+            parts.append(f"\nCRITICAL - TABLE VALIDATION:\n{table_error['rule']}\n")
             if 'common_hallucinations' in table_error:
-                rules_text += "Common table hallucinations:\n"
-                for hallucination in table_error['common_hallucinations']:
-                    rules_text += f"  • {hallucination}\n"
+                parts.append("Common table hallucinations:\n")
+                parts.extend(f"  • {hallucination}\n" for hallucination in table_error['common_hallucinations'])
 
         # Invalid date joins
         if 'invalid_date_joins' in sql_rules['common_mistakes']:
             date_join_error = sql_rules['common_mistakes']['invalid_date_joins']
-            rules_text += f"\n❌ CRITICAL - INVALID DATE JOINS:\n{date_join_error['critical_rule']}\n"
-            rules_text += f"✅ {date_join_error['correct_approach']}\n"
+            parts.append(f"\n❌ CRITICAL - INVALID DATE JOINS:\n{date_join_error['critical_rule']}\n")
+            parts.append(f"✅ {date_join_error['correct_approach']}\n")
 
         # Date key column validation - prevent hallucination
         if 'date_key_column_validation' in sql_rules['common_mistakes']:
             date_col_error = sql_rules['common_mistakes']['date_key_column_validation']
-            rules_text += f"\n❌ CRITICAL - EXACT COLUMN NAMES:\n"
-            rules_text += "DO NOT GUESS column names! Common WRONG guesses:\n"
-            for hallucination in date_col_error.get('common_hallucinations', []):
-                rules_text += f"  ❌ {hallucination}\n"
+            parts.append(f"\n❌ CRITICAL - EXACT COLUMN NAMES:\n")
+            parts.append("DO NOT GUESS column names! Common WRONG guesses:\n")
+            parts.extend(f"  ❌ {hallucination}\n" for hallucination in date_col_error.get('common_hallucinations', []))
             if 'correct_column_names' in date_col_error:
-                rules_text += "CORRECT column names:\n"
-                for table, info in date_col_error['correct_column_names'].items():
-                    rules_text += f"  ✅ {table}: use '{info['date_column']}'\n"
+                parts.append("CORRECT column names:\n")
+                parts.extend(
+                    f"  ✅ {table}: use '{info['date_column']}'\n"
+                    for table, info in date_col_error['correct_column_names'].items()
+                )
 
         # Date integer arithmetic - prevent type clash errors
         if 'date_integer_arithmetic' in sql_rules['common_mistakes']:
             date_arith_error = sql_rules['common_mistakes']['date_integer_arithmetic']
-            rules_text += f"\n❌ CRITICAL - DATE ARITHMETIC:\n{date_arith_error['critical_rule']}\n"
-            rules_text += "WRONG: date_column - 0, CAST('2024-12-31' AS DATE) - 0\n"
-            rules_text += "CORRECT: Use DATEADD(day, 0, date_column) instead\n"
+            parts.append(f"\n❌ CRITICAL - DATE ARITHMETIC:\n{date_arith_error['critical_rule']}\n")
+            parts.append("WRONG: date_column - 0, CAST('2024-12-31' AS DATE) - 0\n")
+            parts.append("CORRECT: Use DATEADD(day, 0, date_column) instead\n")
 
-    return rules_text
+    return "".join(parts)
+
+
+# The knowledge base only changes across deploys, so the rules text is built once at import
+_CORE_RULES_TEXT = _build_core_rules_text()
+
+
+def _get_core_sql_rules():
+    return _CORE_RULES_TEXT
+
+
+def rebuild_core_rules_text():
+    """Rebuild the core rules text from the knowledge base currently on disk."""
+    global _CORE_RULES_TEXT
+    _CORE_RULES_TEXT = _build_core_rules_text()
+
+
+# Static instructions are sent first (system message) so the provider-side
+# prompt cache can reuse them; only the question and data vary per call.
+OUTPUT_FORMAT_INSTRUCTIONS = "Given a user question and the database output for it, provide the answer in HTML format without any css code. Add a 'highlight' class to the metrics, column names and any other key entities in the answer. Include a table with the given data with improved names for the column headings. IMPORTANT: Return ONLY the raw HTML content without wrapping it in code blocks or markdown. Do NOT use ```html or ``` tags."
 
 
 def get_output_format_prompt(db_output, user_query):
-    return f"Given that for the question '{user_query}', database output is '{db_output}', provide the answer in HTML format without any css code. Add a 'highlight' class to the metrics, column names and any other key entities in the answer. Include a table with the given data with improved names for the column headings. IMPORTANT: Return ONLY the raw HTML content without wrapping it in code blocks or markdown. Do NOT use ```html or ``` tags."
+    return f"Question: '{user_query}'\nDatabase output: '{db_output}'"
 
 
+@lru_cache(maxsize=1)
 def _get_verified_query_examples():
     """Get relevant verified query examples for the prompt"""
     verified = load_verified_queries()
@@ -174,58 +192,76 @@ def _get_verified_query_examples():
     critical_patterns = verified.get('critical_patterns', {})
     column_ref = verified.get('column_reference', {})
 
-    text = "\n🔑 CRITICAL COLUMN REFERENCE (USE EXACT NAMES FROM SCHEMA):\n"
+    parts = ["\n🔑 CRITICAL COLUMN REFERENCE (USE EXACT NAMES FROM SCHEMA):\n"]
     for table, info in column_ref.items():
         if isinstance(info, dict):
             if 'date_key' in info:
                 pk = info.get('primary_key', 'N/A')
-                text += f"  • {table}: date_key='{info['date_key']}', primary_key='{pk}'\n"
+                parts.append(f"  • {table}: date_key='{info['date_key']}', primary_key='{pk}'\n")
 
     # Add hallucination warnings
     hallucinations = verified.get('common_hallucinations', {})
     if hallucinations:
         # Wrong tables
         if 'wrong_tables' in hallucinations:
-            text += "\n❌ TABLES THAT DO NOT EXIST:\n"
-            for wrong, correct in hallucinations['wrong_tables'].items():
-                text += f"  • '{wrong}' ❌ → {correct}\n"
+            parts.append("\n❌ TABLES THAT DO NOT EXIST:\n")
+            parts.extend(f"  • '{wrong}' ❌ → {correct}\n" for wrong, correct in hallucinations['wrong_tables'].items())
 
         # Wrong columns
         if 'wrong_columns' in hallucinations:
-            text += "\n❌ COMMON WRONG COLUMN NAMES (DO NOT USE):\n"
-            for wrong, correct in list(hallucinations['wrong_columns'].items())[:6]:
-                text += f"  • '{wrong}' ❌ → {correct}\n"
+            parts.append("\n❌ COMMON WRONG COLUMN NAMES (DO NOT USE):\n")
+            parts.extend(
+                f"  • '{wrong}' ❌ → {correct}\n"
+                for wrong, correct in list(hallucinations['wrong_columns'].items())[:6]
+            )
 
         # Critical table-column mapping
         if 'critical_table_column_mapping' in hallucinations:
-            text += "\n⚠️ CRITICAL - COLUMNS EXIST ONLY IN SPECIFIC TABLES:\n"
-            for col, location in hallucinations['critical_table_column_mapping'].items():
-                text += f"  • {col}: {location}\n"
+            parts.append("\n⚠️ CRITICAL - COLUMNS EXIST ONLY IN SPECIFIC TABLES:\n")
+            parts.extend(
+                f"  • {col}: {location}\n"
+                for col, location in hallucinations['critical_table_column_mapping'].items()
+            )
 
     # Add a few verified example queries
     queries = verified.get('verified_queries', [])
     if queries:
-        text += "\n📋 VERIFIED WORKING QUERY EXAMPLES:\n"
+        parts.append("\n📋 VERIFIED WORKING QUERY EXAMPLES:\n")
         # Include first 2 examples as reference
         for q in queries[:2]:
-            text += f"\nExample ({q['category']}): {q['question']}\n"
+            parts.append(f"\nExample ({q['category']}): {q['question']}\n")
             # Show just key pattern hints
             if 'key_patterns' in q:
-                text += f"Key patterns: {', '.join(q['key_patterns'][:2])}\n"
+                parts.append(f"Key patterns: {', '.join(q['key_patterns'][:2])}\n")
 
-    return text
+    return "".join(parts)
 
 
-def get_ms_sql_prompt():
+def _get_data_period_text():
+    """Data period section; kept at the end of the SQL prompts since it changes whenever date_range.json is refreshed."""
     date_info = load_date_range_info()
+    return f"""DATA PERIOD:
+Years: {date_info.get('Available_Years')}
+Current: Q{date_info.get('Latest_Quarter')} {date_info.get('Latest_Year')}
+Latest Date: {date_info.get('Latest_Year')}-{date_info.get('Latest_Month')}-31
+
+When user says "current" or "latest":
+- WHERE d.year = {date_info.get('Latest_Year')} AND d.quarter = {date_info.get('Latest_Quarter')}"""
+
+
+# The SQL prompts put everything deterministic first and the data period last,
+# so refreshing date_range.json only changes the tail.
+@lru_cache(maxsize=1)
+def get_ms_sql_prompt():
     business_rules = load_business_logic_rules()
 
     # Build business rules from knowledge base
     business_rules_text = ""
     if 'business_rules' in business_rules:
-        business_rules_text = "BUSINESS RULES (from knowledge base):\n"
-        for rule_name, rule_data in business_rules['business_rules'].items():
-            business_rules_text += f"• {rule_data['description']}: {rule_data['sql_pattern']}\n"
+        business_rules_text = "BUSINESS RULES (from knowledge base):\n" + "".join(
+            f"• {rule_data['description']}: {rule_data['sql_pattern']}\n"
+            for rule_data in business_rules['business_rules'].values()
+        )
 
     # Build organization identity rules
     org_identity_text = ""
@@ -246,8 +282,9 @@ SQL PATTERNS FOR "US" vs "COMPETITORS":
 
     # Build example pattern from knowledge base
     example_pattern = ""
-    if 'example_patterns' in load_sql_generation_rules():
-        example_pattern = load_sql_generation_rules()['example_patterns'].get('basic_join', '')
+    sql_rules = load_sql_generation_rules()
+    if 'example_patterns' in sql_rules:
+        example_pattern = sql_rules['example_patterns'].get('basic_join', '')
 
     # Get verified query reference
     verified_examples = _get_verified_query_examples()
@@ -258,11 +295,6 @@ SQL PATTERNS FOR "US" vs "COMPETITORS":
 {verified_examples}
 {org_identity_text}
 
-DATA PERIOD:
-Years: {date_info.get('Available_Years')}
-Current: Q{date_info.get('Latest_Quarter')} {date_info.get('Latest_Year')}
-Latest Date: {date_info.get('Latest_Year')}-{date_info.get('Latest_Month')}-31
-
 ❌ CRITICAL - NEVER USE GETDATE():
 - Data ONLY exists through December 31, 2024
 - GETDATE() returns current system date (beyond available data)
@@ -270,9 +302,6 @@ Latest Date: {date_info.get('Latest_Year')}-{date_info.get('Latest_Month')}-31
 - WRONG: WHERE d.full_date >= DATEADD(month, -1, GETDATE())
 - CORRECT: WHERE d.full_date >= DATEADD(month, -1, CAST('2024-12-31' AS DATE))
 
-When user says "current" or "latest":
-- WHERE d.year = {date_info.get('Latest_Year')} AND d.quarter = {date_info.get('Latest_Quarter')}
-
 {business_rules_text}
 
 EXAMPLE PATTERN:
@@ -289,29 +318,22 @@ IMPORTANT - NEVER SHOW IDs IN RESULTS:
 - Instead of date_key → JOIN dim_date and show full_date
 - Final SELECT must contain human-readable values, NOT numeric IDs/keys
 
-OUTPUT: Return ONLY SQL in ```sql code block. No explanation."""
+OUTPUT: Return ONLY SQL in ```sql code block. No explanation.
 
+{_get_data_period_text()}"""
 
-def get_ms_sql_prompt_for_follow_up():
-    date_info = load_date_range_info()
 
+@lru_cache(maxsize=1)
+def get_ms_sql_prompt_for_follow_up():
     return f"""Answer the current user question using conversation history and provided schema.
 
 {_get_core_sql_rules()}
 
-DATA PERIOD:
-Years: {date_info.get('Available_Years')}
-Current: Q{date_info.get('Latest_Quarter')} {date_info.get('Latest_Year')}
-Latest Date: {date_info.get('Latest_Year')}-{date_info.get('Latest_Month')}-31
-
 ❌ CRITICAL - NEVER USE GETDATE():
 - Data ONLY exists through December 31, 2024
 - GETDATE() returns current system date (beyond available data)
 - For "last N days/months" use: DATEADD(day/month, -N, CAST('2024-12-31' AS DATE))
 
-When user says "current" or "latest":
-- WHERE d.year = {date_info.get('Latest_Year')} AND d.quarter = {date_info.get('Latest_Quarter')}
-
 BUSINESS RULES:
 - New members: (cross_sell_indicator = 0 OR days_since_membership <= 30)
 - Active records: is_current = 1, is_active = 1
@@ -325,30 +347,35 @@ IMPORTANT - NEVER SHOW IDs IN RESULTS:
 - Instead of date_key → JOIN dim_date and show full_date
 - Final SELECT must contain human-readable values, NOT numeric IDs/keys
 
-OUTPUT: Return ONLY SQL in ```sql code block. No explanation."""
+OUTPUT: Return ONLY SQL in ```sql code block. No explanation.
 
+{_get_data_period_text()}"""
 
-def get_sql_error_resolve_prompt(db_error, extracted_sql, db_schema):
+
+@lru_cache(maxsize=1)
+def _error_resolve_prefix():
+    """Static part of the SQL error resolution prompt, built from the knowledge base."""
     sql_rules = load_sql_generation_rules()
     verified = load_verified_queries()
 
     # Build error-specific guidance from knowledge base
-    error_guidance = ""
-    if 'error_resolution_patterns' in sql_rules:
-        for error_type, pattern in sql_rules['error_resolution_patterns'].items():
-            error_guidance += f"\n{pattern['error_pattern']}:\n"
-            if 'root_cause' in pattern:
-                error_guidance += f"Root cause: {pattern['root_cause']}\n"
-            error_guidance += "Fix steps:\n"
-            for step in pattern['resolution_steps']:
-                error_guidance += f"  {step}\n"
+    guidance_parts = []
+    for pattern in sql_rules.get('error_resolution_patterns', {}).values():
+        guidance_parts.append(f"\n{pattern['error_pattern']}:\n")
+        if 'root_cause' in pattern:
+            guidance_parts.append(f"Root cause: {pattern['root_cause']}\n")
+        guidance_parts.append("Fix steps:\n")
+        guidance_parts.extend(f"  {step}\n" for step in pattern['resolution_steps'])
+    error_guidance = "".join(guidance_parts)
 
     # Add column reference from verified queries
-    column_ref_text = "\n🔑 CORRECT DATE KEY COLUMN NAMES (from verified queries):\n"
-    column_ref = verified.get('column_reference', {})
-    for table, info in column_ref.items():
-        if 'date_key' in info:
-            column_ref_text += f"  • {table}: '{info['date_key']}'\n"
+    column_ref_parts = ["\n🔑 CORRECT DATE KEY COLUMN NAMES (from verified queries):\n"]
+    column_ref_parts.extend(
+        f"  • {table}: '{info['date_key']}'\n"
+        for table, info in verified.get('column_reference', {}).items()
+        if 'date_key' in info
+    )
+    column_ref_text = "".join(column_ref_parts)
 
     return f"""Fix the SQL error below. Generate ONLY corrected MS SQL query in ```sql code block.
 
@@ -357,7 +384,11 @@ def get_sql_error_resolve_prompt(db_error, extracted_sql, db_schema):
 
 ERROR RESOLUTION PATTERNS (from knowledge base):
 {error_guidance}
+"""
+
 
+def get_sql_error_resolve_prompt(db_error, extracted_sql, db_schema):
+    return f"""{_error_resolve_prefix()}
 ACTUAL ERROR DETAILS:
 Error: {db_error}
 Failed Query: {extracted_sql}
@@ -2,34 +2,241 @@
 Response caching for LLM and SQL query results.
 Provides in-memory caching with TTL for faster repeated queries.
 """
-import hashlib
+import inspect
+import os
+import queue
+import re
+import threading
 import time
-from typing import Optional, Dict, Any
-from functools import wraps
+from collections import OrderedDict, namedtuple
+from decimal import Decimal
+from typing import Optional, Dict, Any, List, Tuple
+from functools import lru_cache, wraps
 import logging
 
+import orjson
+
+from config import settings
+
+try:
+    import zstandard
+except ImportError:  # compression is skipped without it
+    zstandard = None
+
 logger = logging.getLogger(__name__)
 
+# Relative cache directories resolve against the package, not the working directory
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Cache entry: monotonic expiry time plus the orjson-encoded response.
+# A tuple costs a fraction of the per-entry dict it replaced.
+_Entry = namedtuple('_Entry', 'expires_at data')
+
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+# The same question is canonicalized on get, then again on set after a miss
+@lru_cache(maxsize=1024)
+def _canonicalize(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivially different phrasings share a key."""
+    return _WHITESPACE.sub(' ', question.lower()).strip().rstrip(" .?!;,")
+
+
+# Payloads smaller than this aren't worth compressing
+_COMPRESS_MIN_BYTES = 2048
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# zstd (de)compressors can't be shared between threads concurrently
+_zstd_local = threading.local()
+
+
+def _compress(blob: bytes) -> bytes:
+    if zstandard is None or len(blob) <= _COMPRESS_MIN_BYTES:
+        return blob
+    compressor = getattr(_zstd_local, 'compressor', None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=3)
+    return compressor.compress(blob)
+
+
+def _decompress(blob: bytes) -> bytes:
+    # orjson output never starts with the zstd frame magic, so it marks compressed entries
+    if not blob.startswith(_ZSTD_MAGIC):
+        return blob
+    decompressor = getattr(_zstd_local, 'decompressor', None)
+    if decompressor is None:
+        decompressor = _zstd_local.decompressor = zstandard.ZstdDecompressor()
+    return decompressor.decompress(blob)
+
+
+def _json_default(obj):
+    """Encode values orjson doesn't handle natively the way FastAPI's encoder would."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return str(obj)
+
 class ResponseCache:
-    """In-memory cache for question responses with TTL."""
+    """
+    In-memory LRU cache for question responses with TTL.
+    Entries are spread over independently locked shards so concurrent
+    requests for different questions don't contend on a single lock.
+    """
+
+    NUM_SHARDS = 16
 
-    def __init__(self, default_ttl: int = 3600):
+    def __init__(self, default_ttl: int = 3600, max_entries: int = 10_000, disk_dir: Optional[str] = None):
         """
         Initialize cache.
 
         Args:
             default_ttl: Default time-to-live in seconds (default: 1 hour)
+            max_entries: Maximum entries kept; least recently used are evicted first
+            disk_dir: Optional directory for a persistent diskcache tier that survives restarts
         """
-        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._shards: List["OrderedDict[Tuple[str, str], _Entry]"] = [
+            OrderedDict() for _ in range(self.NUM_SHARDS)
+        ]
+        self._locks = [threading.Lock() for _ in range(self.NUM_SHARDS)]
+        self._stats_lock = threading.Lock()
         self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._shard_max_entries = max(1, -(-max_entries // self.NUM_SHARDS))
         self.hits = 0
         self.misses = 0
+        self._disk = None
+        # Deletes/clears still waiting in the disk queue; reads skip keys they will remove
+        self._pending_lock = threading.Lock()
+        self._pending_deletes: Dict[str, int] = {}
+        self._pending_clears = 0
+        # Bumped on every invalidate/clear so an in-flight disk read can't re-warm a removed entry
+        self._generation = 0
+
+        if disk_dir:
+            try:
+                import diskcache
+                self._disk = diskcache.Cache(disk_dir)
+            except Exception as e:
+                logger.warning(f"Persistent response cache unavailable at {disk_dir}: {e}")
+            else:
+                # Disk writes happen on a background thread to keep them off the request path
+                self._disk_queue: "queue.Queue[Tuple]" = queue.Queue()
+                threading.Thread(target=self._drain_disk_writes, name="response-cache-writer", daemon=True).start()
+
+    def _drain_disk_writes(self) -> None:
+        while True:
+            op, key, data, ttl = self._disk_queue.get()
+            try:
+                if op == "set":
+                    self._disk.set(key, data, expire=ttl)
+                elif op == "delete":
+                    self._disk.delete(key)
+                else:
+                    self._disk.clear()
+            except Exception as e:
+                logger.warning(f"Persistent response cache write failed: {e}")
+            finally:
+                if op != "set":
+                    self._finish_pending(op, key)
+
+    def _queue_removal(self, op: str, disk_key: Optional[str] = None) -> None:
+        """Queue a disk delete/clear behind earlier writes and hide its keys from disk reads."""
+        with self._pending_lock:
+            self._generation += 1
+            if self._disk is None:
+                return
+            if op == "delete":
+                self._pending_deletes[disk_key] = self._pending_deletes.get(disk_key, 0) + 1
+            else:
+                self._pending_clears += 1
+        self._disk_queue.put((op, disk_key, None, None))
+
+    def _finish_pending(self, op: str, disk_key: Optional[str]) -> None:
+        with self._pending_lock:
+            if op == "delete":
+                remaining = self._pending_deletes.pop(disk_key, 1) - 1
+                if remaining > 0:
+                    self._pending_deletes[disk_key] = remaining
+            else:
+                self._pending_clears -= 1
+
+    @staticmethod
+    def _disk_key(key: Tuple[str, str]) -> str:
+        return f"{key[0]}|{key[1]}"
+
+    def _load_from_disk(self, key: Tuple[str, str]) -> Optional[bytes]:
+        """Read an entry from the disk tier and warm it back into memory."""
+        disk_key = self._disk_key(key)
+        with self._pending_lock:
+            if self._pending_clears or disk_key in self._pending_deletes:
+                return None
+            generation = self._generation
+        try:
+            data, expire_time = self._disk.get(disk_key, expire_time=True)
+        except Exception as e:
+            logger.warning(f"Persistent response cache read failed: {e}")
+            return None
+        if data is None:
+            return None
 
-    def _generate_key(self, question: str, question_type: str = "original") -> str:
+        remaining = expire_time - time.time() if expire_time else self.default_ttl
+        if remaining <= 0:
+            return None
+        shard, lock = self._shard(key)
+        with lock:
+            # An invalidate/clear ran while we were reading; the entry is stale
+            if self._generation != generation:
+                return None
+            shard[key] = _Entry(time.monotonic() + remaining, data)
+        return data
+
+    def _store(self, key: Tuple[str, str], entry: _Entry) -> None:
+        shard, lock = self._shard(key)
+        with lock:
+            shard[key] = entry
+            shard.move_to_end(key)
+            while len(shard) > self._shard_max_entries:
+                shard.popitem(last=False)
+
+    def _generate_key(self, question: str, question_type: str = "original") -> Tuple[str, str]:
         """Generate a cache key from the question."""
-        normalized = question.lower().strip()
-        key_string = f"{question_type}:{normalized}"
-        return hashlib.md5(key_string.encode()).hexdigest()
+        if settings.enable_question_canonicalization:
+            return (question_type, _canonicalize(question))
+        return (question_type, question.lower().strip())
+
+    def _shard(self, key: Tuple[str, str]):
+        """Return the (shard, lock) pair that owns a key."""
+        index = hash(key) & (self.NUM_SHARDS - 1)
+        return self._shards[index], self._locks[index]
+
+    def _get_entry(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """Look up a live entry's data by key, refreshing its LRU position. Does not touch stats."""
+        shard, lock = self._shard(key)
+        with lock:
+            entry = shard.get(key)
+            if entry is not None:
+                if time.monotonic() >= entry.expires_at:
+                    # Expired, remove it
+                    del shard[key]
+                    return None
+                shard.move_to_end(key)
+                data = entry.data
+
+        if entry is None:
+            if self._disk is None:
+                return None
+            data = self._load_from_disk(key)
+            if data is None:
+                return None
+        # Each caller gets its own copy, so mutating it can't corrupt the cache
+        return orjson.loads(_decompress(data))
+
+    def _record(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
 
     def get(self, question: str, question_type: str = "original") -> Optional[Dict[str, Any]]:
         """
@@ -42,19 +249,13 @@ class ResponseCache:
         Returns:
             Cached response dict or None if not found/expired
         """
-        key = self._generate_key(question, question_type)
+        data = self._get_entry(self._generate_key(question, question_type))
+        if data is not None:
+            self._record(True)
+            logger.info(f"Cache HIT for question: {question[:50]}...")
+            return data
 
-        if key in self._cache:
-            entry = self._cache[key]
-            if time.time() < entry['expires_at']:
-                self.hits += 1
-                logger.info(f"Cache HIT for question: {question[:50]}...")
-                return entry['data']
-            else:
-                # Expired, remove it
-                del self._cache[key]
-
-        self.misses += 1
+        self._record(False)
         logger.info(f"Cache MISS for question: {question[:50]}...")
         return None
 
@@ -70,54 +271,153 @@ class ResponseCache:
             ttl: Time-to-live in seconds (uses default if not specified)
         """
         key = self._generate_key(question, question_type)
-        expires_at = time.time() + (ttl or self.default_ttl)
+        expires_at = time.monotonic() + (ttl or self.default_ttl)
+        # Stored as flat (and, when large, zstd-compressed) JSON bytes rather than a live object graph
+        data = _compress(orjson.dumps(response, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY))
 
-        self._cache[key] = {
-            'data': response,
-            'expires_at': expires_at,
-            'created_at': time.time()
-        }
+        self._store(key, _Entry(expires_at, data))
+        if self._disk is not None:
+            self._disk_queue.put(("set", self._disk_key(key), data, ttl or self.default_ttl))
         logger.info(f"Cached response for question: {question[:50]}...")
 
     def invalidate(self, question: str, question_type: str = "original") -> bool:
         """Remove a specific entry from cache."""
         key = self._generate_key(question, question_type)
-        if key in self._cache:
-            del self._cache[key]
-            return True
-        return False
+        self._queue_removal("delete", self._disk_key(key))
+        shard, lock = self._shard(key)
+        with lock:
+            return shard.pop(key, None) is not None
 
     def clear(self) -> None:
-        """Clear all cached entries."""
-        self._cache.clear()
-        self.hits = 0
-        self.misses = 0
+        """Clear all cached entries. The disk tier is cleared by the writer thread."""
+        self._queue_removal("clear")
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                shard.clear()
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
 
     def cleanup_expired(self) -> int:
-        """Remove all expired entries. Returns count of removed entries."""
-        current_time = time.time()
-        expired_keys = [
-            key for key, entry in self._cache.items()
-            if current_time >= entry['expires_at']
-        ]
-        for key in expired_keys:
-            del self._cache[key]
-        return len(expired_keys)
+        """
+        Remove all expired entries. Returns count of removed entries.
+        Optional: expired entries are also dropped when looked up, and size is bounded by max_entries.
+        """
+        now = time.monotonic()
+        removed = 0
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                expired_keys = [key for key, entry in shard.items() if now >= entry.expires_at]
+                for key in expired_keys:
+                    del shard[key]
+            removed += len(expired_keys)
+        return removed
 
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics."""
-        total_requests = self.hits + self.misses
-        hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total_requests = hits + misses
+        hit_rate = (hits / total_requests * 100) if total_requests > 0 else 0
         return {
-            'size': len(self._cache),
-            'hits': self.hits,
-            'misses': self.misses,
+            'size': sum(len(shard) for shard in self._shards),
+            'max_entries': self.max_entries,
+            'hits': hits,
+            'misses': misses,
             'hit_rate': f"{hit_rate:.1f}%"
         }
 
 
+class SemanticResponseCache(ResponseCache):
+    """
+    ResponseCache that also answers paraphrased questions.
+    On an exact miss the question is embedded and matched against previously
+    cached questions; a close enough match is served from the exact-match entry,
+    so TTL, LRU eviction and invalidate() apply to semantic hits as well.
+    Questions are only matched against others with the same numbers and quoted strings.
+    """
+
+    # Question types keyed by the question text; the others are keyed by question_id
+    SEMANTIC_QUESTION_TYPES = ("original", "insights", "related")
+
+    def __init__(self, default_ttl: int = 3600, max_entries: int = 10_000, disk_dir: Optional[str] = None,
+                 threshold: float = 0.95):
+        """
+        Initialize cache.
+
+        Args:
+            default_ttl: Default time-to-live in seconds (default: 1 hour)
+            max_entries: Maximum entries kept; least recently used are evicted first
+            disk_dir: Optional directory for a persistent diskcache tier that survives restarts
+            threshold: Minimum cosine similarity for a semantic hit
+        """
+        super().__init__(default_ttl=default_ttl, max_entries=max_entries, disk_dir=disk_dir)
+        from llm.semantic_cache import SemanticCache, question_literals
+        from llm.schema_intelligence import embed_query_normalized
+        # Maps an embedded question to the normalized question it was cached under
+        self._semantic = SemanticCache(
+            threshold=threshold, ttl=default_ttl, max_size=max_entries, embed_fn=embed_query_normalized
+        )
+        self._question_literals = question_literals
+        self.semantic_hits = 0
+
+    def _semantic_namespace(self, question: str, question_type: str) -> str:
+        # "top 10 customers in 2023" and "top 20 customers in 2024" embed almost identically
+        return f"{question_type}|{self._question_literals(question)}"
+
+    def get(self, question: str, question_type: str = "original") -> Optional[Dict[str, Any]]:
+        response = super().get(question, question_type)
+        if response is not None or question_type not in self.SEMANTIC_QUESTION_TYPES:
+            return response
+
+        matched_question = self._semantic.get(
+            self._semantic_namespace(question, question_type), self._generate_key(question, question_type)[1]
+        )
+        if matched_question is None:
+            return None
+
+        data = self._get_entry((question_type, matched_question))
+        if data is None:
+            return None
+
+        # super().get() already counted this lookup as a miss
+        with self._stats_lock:
+            self.misses -= 1
+            self.hits += 1
+            self.semantic_hits += 1
+        logger.info(f"Semantic cache HIT for question: {question[:50]}...")
+        return data
+
+    def set(self, question: str, response: Dict[str, Any],
+            question_type: str = "original", ttl: Optional[int] = None) -> None:
+        super().set(question, response, question_type, ttl)
+        if question_type in self.SEMANTIC_QUESTION_TYPES:
+            normalized = self._generate_key(question, question_type)[1]
+            self._semantic.set(self._semantic_namespace(question, question_type), normalized, normalized)
+
+    def clear(self) -> None:
+        super().clear()
+        self._semantic.clear()
+        with self._stats_lock:
+            self.semantic_hits = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        with self._stats_lock:
+            stats['semantic_hits'] = self.semantic_hits
+        return stats
+
+
 # Global cache instance
-_response_cache = ResponseCache(default_ttl=3600)  # 1 hour default
+_disk_dir = os.path.join(_PACKAGE_DIR, settings.response_cache_dir) if settings.response_cache_dir else None
+if settings.enable_semantic_response_caching:
+    _response_cache = SemanticResponseCache(
+        default_ttl=3600,  # 1 hour default
+        disk_dir=_disk_dir,
+        threshold=settings.semantic_response_cache_threshold
+    )
+else:
+    _response_cache = ResponseCache(default_ttl=3600, disk_dir=_disk_dir)  # 1 hour default
 
 
 def get_response_cache() -> ResponseCache:
@@ -125,21 +425,43 @@ def get_response_cache() -> ResponseCache:
     return _response_cache
 
 
-def cached_response(question_type: str = "original", ttl: int = 3600):
+def _is_failed_result(result) -> bool:
+    """Falsy results and error dicts are treated as failures."""
+    return not result or (isinstance(result, dict) and "error" in result)
+
+
+def cached_response(question_type: str = "original", ttl: int = 3600, negative_ttl: int = 30,
+                    arg_name: str = "question", arg_index: Optional[int] = None):
     """
     Decorator for caching function responses based on question.
+    Failed results are also cached briefly so repeated failing questions
+    don't each hit the LLM and database again during an outage.
 
     Args:
         question_type: Type identifier for the cache key
         ttl: Cache TTL in seconds
+        negative_ttl: Cache TTL in seconds for failed results (0 disables)
+        arg_name: Name of the wrapped function's parameter holding the question
+        arg_index: Positional index of the question, if it should not be looked up by name
     """
+    negative_type = f"{question_type}:neg"
+
     def decorator(func):
+        signature = inspect.signature(func)
+        if arg_index is None and arg_name not in signature.parameters:
+            raise ValueError(f"{func.__name__} has no parameter named '{arg_name}' to cache on")
+
+        def get_question(args, kwargs):
+            if arg_index is not None:
+                return args[arg_index] if len(args) > arg_index else kwargs.get(arg_name)
+            try:
+                return signature.bind_partial(*args, **kwargs).arguments.get(arg_name)
+            except TypeError:
+                return None
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Try to extract question from args or kwargs
-            question = kwargs.get('query') or kwargs.get('question')
-            if question is None and len(args) > 2:
-                question = args[2]  # Usually the 3rd argument
+            question = get_question(args, kwargs)
 
             if question:
                 cache = get_response_cache()
@@ -147,12 +469,24 @@ def cached_response(question_type: str = "original", ttl: int = 3600):
                 if cached is not None:
                     return cached
 
+                if negative_ttl:
+                    # Looked up directly so it doesn't count towards hit/miss stats
+                    negative = cache._get_entry(cache._generate_key(question, negative_type))
+                    if negative is not None:
+                        logger.info(f"Negative cache HIT for question: {question[:50]}...")
+                        return negative["result"]
+
                 # Execute function and cache result
                 result = func(*args, **kwargs)
 
-                # Only cache successful responses
-                if result and not isinstance(result, Exception):
+                if isinstance(result, Exception):
+                    return result
+
+                if not _is_failed_result(result):
                     cache.set(question, result, question_type, ttl)
+                elif negative_ttl:
+                    # Wrapped so a cached None/empty result is distinguishable from a miss
+                    cache.set(question, {"result": result}, negative_type, negative_ttl)
 
                 return result
 
@@ -10,11 +10,115 @@ Components:
 """
 
 import re
+import sys
 import json
-from typing import Dict, List, Tuple, Optional, Set
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+import faiss
+import numpy as np
+from typing import Dict, FrozenSet, List, Tuple, Optional, Sequence, Set
+from rapidfuzz import process, fuzz
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain.schema import Document
+
+# Below this many tables an exact flat index is fast enough and has perfect recall
+_HNSW_MIN_TABLES = 500
+# Above this many tables vectors are product-quantized (16 bytes each) to cut index memory
+_PQ_MIN_TABLES = 1000
+_PQ_SUBVECTORS = 16
+
+# Table documents embedded per embed_documents call (sentence-transformers batches within it)
+_EMBED_CHUNK_SIZE = 256
+_EMBED_BATCH_SIZE = 64
+
+# Retrieval results kept per SchemaIntelligence instance, keyed on the normalized query
+_SCHEMA_CACHE_SIZE = 256
+# Schema context strings kept per SchemaIntelligence instance, keyed on the table set
+_SCHEMA_CONTEXT_CACHE_SIZE = 256
+
+# Patterns used on every validation/fix pass, compiled once at import
+_IDENT = r'[a-zA-Z_][a-zA-Z0-9_]*'
+_CREATE_COLUMNS_RE = re.compile(r'\((.*?)\)(?:\s*/\*|$)', re.DOTALL)
+# First identifier on each column-definition line, skipping constraint lines and -- comments
+_COLUMN_LINE_RE = re.compile(
+    r'^[ \t,]*(?!(?:PRIMARY|FOREIGN|CONSTRAINT|INDEX|UNIQUE|CHECK)\b)[`"\[]?([a-zA-Z_]\w*)',
+    re.MULTILINE | re.IGNORECASE
+)
+# One scan yields both table clauses (FROM/JOIN/INTO/UPDATE + optional alias) and
+# qualifier.column references. Only the keyword is consumed; table and alias are read
+# in a lookahead so "FROM a JOIN b c" doesn't swallow the JOIN and "FROM dbo.t" still
+# yields the dotted reference.
+_SQL_SCAN_RE = re.compile(
+    rf'\b(?:(FROM|JOIN)|INTO|UPDATE)\s+(?=({_IDENT})(?:\s+(?:AS\s+)?({_IDENT})\b)?)'
+    rf'|\b({_IDENT})\.({_IDENT})\b',
+    re.IGNORECASE
+)
+# Words that can follow a table name but are never its alias
+_SQL_KEYWORDS = frozenset({
+    'ON', 'WHERE', 'AND', 'OR', 'INNER', 'LEFT', 'RIGHT', 'OUTER', 'CROSS', 'JOIN',
+    'AS', 'GROUP', 'ORDER', 'HAVING', 'LIMIT', 'UNION'
+})
+
+# Subquery validation runs against upper-cased SQL, so these need no IGNORECASE
+_EQ_SUBQUERY_RE = re.compile(r'=\s*\(\s*SELECT\s+(?!TOP\s+1)(?!MAX\s*\()(?!MIN\s*\()(?!COUNT\s*\()(?!SUM\s*\()(?!AVG\s*\()')
+_EQ_SUBQUERY_SELECT_RE = re.compile(r'=\s*\(\s*SELECT\s+([^)]+?)\s+FROM')
+_NESTED_EQ_SUBQUERY_RE = re.compile(r'=\s*\(\s*SELECT[^)]+WHERE[^)]+\(\s*SELECT')
+_GROUP_SUBQUERY_RE = re.compile(r'=\s*\(\s*SELECT[^)]+GROUP\s+BY[^)]+\)')
+
+_COLUMN_FIX_RE = re.compile(r"Column '([^']+)' does not exist.*Did you mean: ([^?]+)\?")
+_SELECT_RE = re.compile(r'(SELECT\s+)', re.IGNORECASE)
+_EQ_SUBQUERY_FIX_RE = re.compile(r'=\s*\(\s*SELECT\s+[^)]+\s+FROM\s+[^)]+\)', re.IGNORECASE)
+_NESTED_SUBQUERY_FIX_RE = re.compile(r'\(\s*SELECT\s+(?!TOP)[^)]+WHERE[^)]+\(\s*SELECT\s+(?!TOP)[^)]+\)\s*\)', re.IGNORECASE)
+_DATE_SUBQUERY_FIX_RE = re.compile(r'\(\s*SELECT\s+TOP\s+1[^)]+DIM_DATE[^)]+\)', re.IGNORECASE)
+
+# Embedding model shared by every SchemaIntelligence in the process, loaded on first use
+_EMBEDDER: Optional[HuggingFaceEmbeddings] = None
+_EMBEDDER_LOCK = threading.Lock()
+
+
+def _get_embedder() -> HuggingFaceEmbeddings:
+    """Get the shared HuggingFaceEmbeddings instance, loading the model once."""
+    global _EMBEDDER
+    if _EMBEDDER is None:
+        with _EMBEDDER_LOCK:
+            if _EMBEDDER is None:
+                _EMBEDDER = HuggingFaceEmbeddings(encode_kwargs={"batch_size": _EMBED_BATCH_SIZE})
+    return _EMBEDDER
+
+
+def embed_query_normalized(text: str) -> np.ndarray:
+    """Embed text with the shared embedder as a unit-length float32 row vector (for inner-product search)."""
+    embedding = np.asarray([_get_embedder().embed_query(text)], dtype='float32')
+    faiss.normalize_L2(embedding)
+    return embedding
+
+
+@lru_cache(maxsize=512)
+def _scan_sql(sql: str) -> Tuple[FrozenSet[str], Tuple[Tuple[str, str], ...], Tuple[Tuple[str, str], ...]]:
+    """
+    Tokenize SQL once for validation.
+
+    Returns:
+        Tuple of (upper-cased tables used, (alias, table) pairs, (table_or_alias, column) references)
+    """
+    tables = set()
+    aliases = []
+    references = []
+
+    # finditer streams matches instead of materializing findall's list for long SQL
+    for match in _SQL_SCAN_RE.finditer(sql):
+        clause, table, alias, table_or_alias, column = match.groups()
+        if table:
+            tables.add(table.upper())
+            # Only FROM/JOIN introduce aliases; make sure alias is not a keyword
+            if clause and alias and alias.upper() not in _SQL_KEYWORDS:
+                aliases.append((alias.lower(), table))
+        else:
+            references.append((table_or_alias, sys.intern(column)))
+
+    return frozenset(tables), tuple(aliases), tuple(references)
 
 
 class SchemaIntelligence:
@@ -28,9 +132,20 @@ class SchemaIntelligence:
             create_statement_dict: Dict mapping table names to CREATE TABLE statements
         """
         self.schema_dict = create_statement_dict
+        # Fingerprint of the schema snapshot; caches keyed on it are invalidated by schema drift
+        self.schema_hash = hashlib.blake2b(
+            "\n".join(create_statement_dict[table] for table in sorted(create_statement_dict)).encode(),
+            digest_size=16
+        ).hexdigest()
         self.table_columns = self._extract_all_columns()
-        self.embeddings = HuggingFaceEmbeddings()
+        # Set view of each table's columns for membership checks during validation
+        self.table_column_sets = {table: frozenset(columns) for table, columns in self.table_columns.items()}
+        self.embeddings = _get_embedder()
         self.faiss_index = self._build_faiss_index()
+        self._schema_cache: "OrderedDict[Tuple[str, int], List[Tuple[Dict, float]]]" = OrderedDict()
+        self._schema_cache_lock = threading.Lock()
+        # Per-instance memo of the schema context for a table set; schema_dict is fixed after init
+        self._schema_context_cached = lru_cache(maxsize=_SCHEMA_CONTEXT_CACHE_SIZE)(self._build_schema_context)
 
     def _extract_all_columns(self) -> Dict[str, List[str]]:
         """Extract column names from all CREATE TABLE statements."""
@@ -38,59 +153,66 @@ class SchemaIntelligence:
 
         for table_name, create_stmt in self.schema_dict.items():
             columns = self._extract_columns_from_create(create_stmt)
+            # Keyed by upper-cased name only; lookups upper-case the table first
             table_columns[table_name.upper()] = columns
-            # Also store lowercase version for matching
-            table_columns[table_name.lower()] = columns
 
         return table_columns
 
     def _extract_columns_from_create(self, create_stmt: str) -> List[str]:
         """Extract column names from a CREATE TABLE statement."""
-        columns = []
-
         # Find content between parentheses
-        match = re.search(r'\((.*?)\)(?:\s*/\*|$)', create_stmt, re.DOTALL)
+        match = _CREATE_COLUMNS_RE.search(create_stmt)
         if not match:
-            return columns
-
-        columns_section = match.group(1)
+            return []
 
-        # Split by comma and newline, extract column names
-        for line in columns_section.split('\n'):
-            line = line.strip().strip(',')
-            if line and not line.startswith('--'):
-                # First word is column name
-                parts = line.split()
-                if parts and not parts[0].upper() in ('PRIMARY', 'FOREIGN', 'CONSTRAINT', 'INDEX', 'UNIQUE'):
-                    col_name = parts[0].strip('`"[]')
-                    columns.append(col_name.lower())
-
-        return columns
+        # One scan over the block; the first identifier on each line is the column name.
+        # Interned so tables sharing a column (e.g. date_key) share one string object
+        return [sys.intern(m.group(1).lower()) for m in _COLUMN_LINE_RE.finditer(match.group(1))]
 
     def _build_faiss_index(self) -> FAISS:
         """Build FAISS index for semantic schema search."""
-        documents = []
+        texts = []
+        metadatas = []
 
         for table_name, create_stmt in self.schema_dict.items():
             # Create searchable document with table info
             columns = self.table_columns.get(table_name.upper(), [])
 
-            # Build rich description for semantic search
-            doc_content = f"""
-Table: {table_name}
-Columns: {', '.join(columns)}
-Schema: {create_stmt[:500]}
-"""
-            documents.append(Document(
-                page_content=doc_content,
-                metadata={
-                    "table_name": table_name,
-                    "columns": columns,
-                    "create_statement": create_stmt
-                }
-            ))
+            # Compact "table: columns" text keeps embedding input short; the DDL lives in metadata
+            texts.append(f"{table_name}: {', '.join(columns)}")
+            metadatas.append({
+                "table_name": table_name,
+                "columns": columns,
+                "create_statement": create_stmt
+            })
 
-        return FAISS.from_documents(documents, self.embeddings)
+        # Embed explicitly in large chunks rather than relying on the wrapper's batching
+        text_embeddings = []
+        for start in range(0, len(texts), _EMBED_CHUNK_SIZE):
+            text_embeddings.extend(self.embeddings.embed_documents(texts[start:start + _EMBED_CHUNK_SIZE]))
+
+        vectorstore = FAISS.from_embeddings(list(zip(texts, text_embeddings)), self.embeddings, metadatas=metadatas)
+
+        # Large schemas: swap the exact flat index for an approximate one so a query
+        # no longer scans every table; vector ids (and the docstore mapping) are unchanged
+        flat_index = vectorstore.index
+        ntotal, d = flat_index.ntotal, flat_index.d
+        if ntotal >= _PQ_MIN_TABLES and d % _PQ_SUBVECTORS == 0:
+            vectors = flat_index.reconstruct_n(0, ntotal)
+            nlist = min(64, ntotal // 4)
+            pq_index = faiss.IndexIVFPQ(faiss.IndexFlatL2(d), d, nlist, _PQ_SUBVECTORS, 8)
+            pq_index.train(vectors)
+            pq_index.add(vectors)
+            pq_index.nprobe = min(8, nlist)
+            vectorstore.index = pq_index
+        elif ntotal >= _HNSW_MIN_TABLES:
+            hnsw_index = faiss.IndexHNSWFlat(d, 32)
+            hnsw_index.hnsw.efConstruction = 40
+            hnsw_index.hnsw.efSearch = 64
+            hnsw_index.add(flat_index.reconstruct_n(0, ntotal))
+            vectorstore.index = hnsw_index
+
+        return vectorstore
 
     def get_relevant_schemas(self, query: str, top_k: int = 5) -> List[Dict]:
         """
@@ -103,17 +225,81 @@ Schema: {create_stmt[:500]}
         Returns:
             List of dicts with table_name, columns, create_statement
         """
-        results = self.faiss_index.similarity_search(query, k=top_k)
+        return [schema for schema, _ in self.get_relevant_schemas_with_scores(query, top_k)]
+
+    def get_relevant_schemas_with_scores(self, query: str, top_k: int = 5) -> List[Tuple[Dict, float]]:
+        """
+        Retrieve most relevant table schemas for a query along with their FAISS distances.
 
-        schemas = []
-        for doc in results:
-            schemas.append({
+        Args:
+            query: User's natural language question
+            top_k: Number of tables to retrieve
+
+        Returns:
+            List of (schema dict, L2 distance) tuples, closest first (lower is more relevant)
+        """
+        # Validation retries and fix-and-revalidate loops re-ask the same question
+        key = (' '.join(query.lower().split()), top_k)
+        with self._schema_cache_lock:
+            cached = self._schema_cache.get(key)
+            if cached is not None:
+                self._schema_cache.move_to_end(key)
+                return list(cached)
+
+        scored_schemas = self._search_schemas(query, top_k)
+
+        with self._schema_cache_lock:
+            self._schema_cache[key] = scored_schemas
+            if len(self._schema_cache) > _SCHEMA_CACHE_SIZE:
+                self._schema_cache.popitem(last=False)
+        return list(scored_schemas)
+
+    def _search_schemas(self, query: str, top_k: int) -> List[Tuple[Dict, float]]:
+        results = self.faiss_index.similarity_search_with_score(query, k=top_k)
+
+        scored_schemas = []
+        for doc, distance in results:
+            scored_schemas.append(({
                 "table_name": doc.metadata["table_name"],
                 "columns": doc.metadata["columns"],
                 "create_statement": doc.metadata["create_statement"]
-            })
+            }, float(distance)))
+
+        return scored_schemas
+
+    def get_relevant_schemas_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict]]:
+        """
+        Retrieve relevant table schemas for several queries with one embedding
+        call and one FAISS search over the stacked query vectors.
+
+        Args:
+            queries: User questions (or candidate rewrites)
+            top_k: Number of tables to retrieve per query
 
-        return schemas
+        Returns:
+            One list of schema dicts per query, as returned by get_relevant_schemas
+        """
+        if not queries:
+            return []
+
+        embeddings = np.asarray(self.embeddings.embed_documents(queries), dtype='float32')
+        _, indices = self.faiss_index.index.search(embeddings, top_k)
+
+        batch = []
+        for row in indices:
+            schemas = []
+            for i in row:
+                if i == -1:
+                    continue
+                doc = self.faiss_index.docstore.search(self.faiss_index.index_to_docstore_id[i])
+                schemas.append({
+                    "table_name": doc.metadata["table_name"],
+                    "columns": doc.metadata["columns"],
+                    "create_statement": doc.metadata["create_statement"]
+                })
+            batch.append(schemas)
+
+        return batch
 
     def validate_sql(self, sql: str) -> Tuple[bool, List[str]]:
         """
@@ -134,23 +320,24 @@ Schema: {create_stmt[:500]}
         columns_used = self._extract_columns_from_sql(sql)
 
         # Validate tables exist
-        for table in tables_used:
-            table_upper = table.upper()
-            if table_upper not in self.table_columns and table.lower() not in self.table_columns:
-                errors.append(f"Table '{table}' does not exist. Available tables: {', '.join(list(self.schema_dict.keys())[:10])}")
+        for table_upper in tables_used:
+            if table_upper not in self.table_columns:
+                errors.append(f"Table '{table_upper}' does not exist. Available tables: {', '.join(list(self.schema_dict.keys())[:10])}")
 
         # Validate columns exist in their tables
         for table, columns in columns_used.items():
-            table_upper = table.upper()
-            if table_upper in self.table_columns:
-                valid_columns = set(self.table_columns[table_upper])
-                for col in columns:
-                    col_lower = col.lower()
-                    if col_lower not in valid_columns:
-                        # Find similar columns
-                        similar = self._find_similar_columns(col_lower, valid_columns)
-                        suggestion = f" Did you mean: {similar}?" if similar else ""
-                        errors.append(f"Column '{col}' does not exist in table '{table}'.{suggestion} Valid columns: {', '.join(list(valid_columns)[:15])}")
+            # Keys are already upper-cased by _extract_columns_from_sql
+            valid_columns = self.table_column_sets.get(table)
+            if valid_columns is None:
+                continue
+            ordered_columns = self.table_columns[table]
+            for col in columns:
+                col_lower = col.lower()
+                if col_lower not in valid_columns:
+                    # Find similar columns (ordered list keeps tie-breaking deterministic)
+                    similar = self._find_similar_columns(col_lower, ordered_columns)
+                    suggestion = f" Did you mean: {similar}?" if similar else ""
+                    errors.append(f"Column '{col}' does not exist in table '{table}'.{suggestion} Valid columns: {', '.join(ordered_columns[:15])}")
 
         # Validate subqueries don't return multiple values with = operator
         subquery_errors = self._validate_subqueries(sql)
@@ -168,14 +355,17 @@ Schema: {create_stmt[:500]}
         errors = []
         sql_upper = sql.upper()
 
+        # Every pattern below needs "= (SELECT"; a whitespace-free substring check
+        # skips all regex work for SQL without such a subquery
+        if '=(SELECT' not in ''.join(sql_upper.split()):
+            return errors
+
         # Pattern 1: = (SELECT without TOP 1 or MAX/MIN/COUNT)
         # Find subqueries used with = operator
-        eq_subquery_pattern = r'=\s*\(\s*SELECT\s+(?!TOP\s+1)(?!MAX\s*\()(?!MIN\s*\()(?!COUNT\s*\()(?!SUM\s*\()(?!AVG\s*\()'
-        if re.search(eq_subquery_pattern, sql_upper):
+        if _EQ_SUBQUERY_RE.search(sql_upper):
             # Check if it's a potentially problematic subquery
             # Look for patterns like: = (SELECT column FROM table WHERE ...)
-            detailed_pattern = r'=\s*\(\s*SELECT\s+([^)]+?)\s+FROM'
-            matches = re.findall(detailed_pattern, sql_upper)
+            matches = _EQ_SUBQUERY_SELECT_RE.findall(sql_upper)
             for match in matches:
                 # If selecting a non-aggregated column, it might return multiple values
                 if not any(agg in match for agg in ['MAX(', 'MIN(', 'COUNT(', 'SUM(', 'AVG(', 'TOP 1']):
@@ -187,16 +377,14 @@ Schema: {create_stmt[:500]}
 
         # Pattern 2: Nested subqueries that could cause issues
         # WHERE col = (SELECT ... WHERE col2 = (SELECT ...))
-        nested_eq_subquery = r'=\s*\(\s*SELECT[^)]+WHERE[^)]+\(\s*SELECT'
-        if re.search(nested_eq_subquery, sql_upper):
+        if _NESTED_EQ_SUBQUERY_RE.search(sql_upper):
             errors.append(
                 f"SUBQUERY WARNING: Nested subqueries with '=' operator detected. "
                 f"Consider using JOINs or ensure each subquery returns exactly one value with TOP 1."
             )
 
         # Pattern 3: GROUP BY in subquery used with = (without HAVING that limits to 1)
-        group_subquery = r'=\s*\(\s*SELECT[^)]+GROUP\s+BY[^)]+\)'
-        if re.search(group_subquery, sql_upper):
+        if _GROUP_SUBQUERY_RE.search(sql_upper):
             # Check if there's a TOP 1 or aggregate
             if 'TOP 1' not in sql_upper:
                 errors.append(
@@ -207,99 +395,53 @@ Schema: {create_stmt[:500]}
         return errors
 
     def _extract_tables_from_sql(self, sql: str) -> Set[str]:
-        """Extract table names from SQL query."""
-        tables = set()
-
-        # Pattern for FROM and JOIN clauses
-        patterns = [
-            r'\bFROM\s+([a-zA-Z_][a-zA-Z0-9_]*)',
-            r'\bJOIN\s+([a-zA-Z_][a-zA-Z0-9_]*)',
-            r'\bINTO\s+([a-zA-Z_][a-zA-Z0-9_]*)',
-            r'\bUPDATE\s+([a-zA-Z_][a-zA-Z0-9_]*)',
-        ]
-
-        for pattern in patterns:
-            matches = re.findall(pattern, sql, re.IGNORECASE)
-            tables.update(matches)
-
-        return tables
+        """Extract upper-cased table names from SQL query."""
+        return set(_scan_sql(sql)[0])
 
     def _extract_columns_from_sql(self, sql: str) -> Dict[str, Set[str]]:
         """
         Extract columns and their associated tables from SQL.
         Returns dict mapping table alias/name to set of columns.
         """
-        columns_by_table = {}
+        columns_by_table = defaultdict(set)
 
         # Build alias mapping
-        alias_map = self._build_alias_map(sql)
-
-        # Find table.column or alias.column references
-        pattern = r'\b([a-zA-Z_][a-zA-Z0-9_]*)\.([a-zA-Z_][a-zA-Z0-9_]*)\b'
-        matches = re.findall(pattern, sql)
+        resolve_alias = self._build_alias_map(sql).get
 
-        for table_or_alias, column in matches:
-            # Resolve alias to actual table name
-            actual_table = alias_map.get(table_or_alias.lower(), table_or_alias)
-
-            if actual_table.upper() not in columns_by_table:
-                columns_by_table[actual_table.upper()] = set()
-            columns_by_table[actual_table.upper()].add(column)
+        # table.column or alias.column references, with aliases resolved to actual table names
+        for table_or_alias, column in _scan_sql(sql)[2]:
+            columns_by_table[resolve_alias(table_or_alias.lower(), table_or_alias).upper()].add(column)
 
         return columns_by_table
 
     def _build_alias_map(self, sql: str) -> Dict[str, str]:
         """Build mapping from table aliases to actual table names."""
-        alias_map = {}
-
         # Pattern: table_name alias or table_name AS alias
-        patterns = [
-            r'\bFROM\s+([a-zA-Z_][a-zA-Z0-9_]*)\s+(?:AS\s+)?([a-zA-Z_][a-zA-Z0-9_]*)\b',
-            r'\bJOIN\s+([a-zA-Z_][a-zA-Z0-9_]*)\s+(?:AS\s+)?([a-zA-Z_][a-zA-Z0-9_]*)\b',
-        ]
-
-        for pattern in patterns:
-            matches = re.findall(pattern, sql, re.IGNORECASE)
-            for table, alias in matches:
-                # Make sure alias is not a keyword
-                if alias.upper() not in ('ON', 'WHERE', 'AND', 'OR', 'INNER', 'LEFT', 'RIGHT', 'OUTER', 'CROSS', 'JOIN'):
-                    alias_map[alias.lower()] = table
-
-        return alias_map
-
-    def _find_similar_columns(self, column: str, valid_columns: Set[str]) -> Optional[str]:
-        """Find similar column names using simple string matching."""
-        column = column.lower()
-
-        # Direct substring match
-        for valid in valid_columns:
-            if column in valid or valid in column:
-                return valid
-
-        # Word overlap
-        col_words = set(re.split(r'[_\s]', column))
-        best_match = None
-        best_score = 0
+        return dict(_scan_sql(sql)[1])
 
-        for valid in valid_columns:
-            valid_words = set(re.split(r'[_\s]', valid))
-            overlap = len(col_words & valid_words)
-            if overlap > best_score:
-                best_score = overlap
-                best_match = valid
+    def _find_similar_columns(self, column: str, valid_columns: Sequence[str]) -> Optional[str]:
+        """Find the closest valid column name using RapidFuzz weighted similarity."""
+        column = column.lower()
+        # Nothing meaningful to match for one-character names or SQL keywords
+        if len(column) < 2 or column.upper() in _SQL_KEYWORDS or not valid_columns:
+            return None
 
-        return best_match if best_score > 0 else None
+        best = process.extractOne(column, valid_columns, scorer=fuzz.WRatio, score_cutoff=60)
+        return best[0] if best else None
 
     def get_schema_context_for_tables(self, table_names: List[str]) -> str:
-        """Get formatted schema context for specific tables."""
-        context_parts = []
+        """
+        Get formatted schema context for specific tables.
 
-        for table in table_names:
-            table_upper = table.upper()
-            if table_upper in self.schema_dict:
-                context_parts.append(self.schema_dict[table_upper])
+        Unknown tables are dropped, and the rest are deduplicated case-insensitively and
+        emitted in sorted order, so the same table set always yields the same (cached)
+        context string.
+        """
+        known_tables = self.schema_dict.keys() & {table.upper() for table in table_names}
+        return self._schema_context_cached(tuple(sorted(known_tables)))
 
-        return "\n\n".join(context_parts)
+    def _build_schema_context(self, tables: Tuple[str, ...]) -> str:
+        return "\n\n".join(self.schema_dict[table_upper] for table_upper in tables)
 
     def fix_invalid_sql(self, sql: str, errors: List[str]) -> Tuple[str, List[str]]:
         """
@@ -314,26 +456,29 @@ Schema: {create_stmt[:500]}
         """
         fixed_sql = sql
         remaining_errors = []
+        renames = {}
+        fix_subqueries = False
 
         for error in errors:
             # Try to extract column fix suggestion
-            match = re.search(r"Column '([^']+)' does not exist.*Did you mean: ([^?]+)\?", error)
+            match = _COLUMN_FIX_RE.search(error)
             if match:
-                wrong_col = match.group(1)
-                suggested_col = match.group(2).strip()
-                # Replace wrong column with suggested
-                fixed_sql = re.sub(
-                    rf'\b{re.escape(wrong_col)}\b',
-                    suggested_col,
-                    fixed_sql,
-                    flags=re.IGNORECASE
-                )
+                # First suggestion for a column wins, as with sequential replacement
+                renames.setdefault(match.group(1).lower(), match.group(2).strip())
             elif "SUBQUERY WARNING" in error:
-                # Try to fix subquery issues
-                fixed_sql = self._fix_subquery_issues(fixed_sql)
+                fix_subqueries = True
             else:
                 remaining_errors.append(error)
 
+        if renames:
+            # Replace every wrong column with its suggestion in a single pass
+            rename_re = re.compile(rf'\b({"|".join(map(re.escape, renames))})\b', re.IGNORECASE)
+            fixed_sql = rename_re.sub(lambda m: renames[m.group(1).lower()], fixed_sql)
+
+        if fix_subqueries:
+            # Try to fix subquery issues
+            fixed_sql = self._fix_subquery_issues(fixed_sql)
+
         return fixed_sql, remaining_errors
 
     def _fix_subquery_issues(self, sql: str) -> str:
@@ -356,11 +501,10 @@ Schema: {create_stmt[:500]}
             if 'TOP' in full_match.upper() or any(agg in full_match.upper() for agg in ['MAX(', 'MIN(', 'COUNT(', 'SUM(', 'AVG(']):
                 return full_match
             # Add TOP 1 after SELECT
-            return re.sub(r'(SELECT\s+)', r'\1TOP 1 ', full_match, flags=re.IGNORECASE)
+            return _SELECT_RE.sub(r'\1TOP 1 ', full_match)
 
         # Find = (SELECT ... FROM ...) patterns and add TOP 1
-        pattern = r'=\s*\(\s*SELECT\s+[^)]+\s+FROM\s+[^)]+\)'
-        fixed_sql = re.sub(pattern, add_top_1_to_subquery, fixed_sql, flags=re.IGNORECASE)
+        fixed_sql = _EQ_SUBQUERY_FIX_RE.sub(add_top_1_to_subquery, fixed_sql)
 
         # Fix 2: For nested subqueries, ensure inner ones have TOP 1
         # This is a more aggressive fix for deeply nested subqueries
@@ -368,12 +512,11 @@ Schema: {create_stmt[:500]}
             inner_sql = match.group(0)
             # Add TOP 1 to inner SELECT if missing
             if 'TOP' not in inner_sql.upper():
-                inner_sql = re.sub(r'(SELECT\s+)', r'\1TOP 1 ', inner_sql, count=1, flags=re.IGNORECASE)
+                inner_sql = _SELECT_RE.sub(r'\1TOP 1 ', inner_sql, count=1)
             return inner_sql
 
         # Look for subqueries within WHERE clauses of other subqueries
-        nested_pattern = r'\(\s*SELECT\s+(?!TOP)[^)]+WHERE[^)]+\(\s*SELECT\s+(?!TOP)[^)]+\)\s*\)'
-        fixed_sql = re.sub(nested_pattern, fix_nested_subquery, fixed_sql, flags=re.IGNORECASE)
+        fixed_sql = _NESTED_SUBQUERY_FIX_RE.sub(fix_nested_subquery, fixed_sql)
 
         # Fix 3: Add ORDER BY with TOP 1 for date-related subqueries if missing
         # Pattern: TOP 1 ... FROM DIM_DATE ... without ORDER BY
@@ -384,8 +527,7 @@ Schema: {create_stmt[:500]}
                 return full_match.rstrip(')') + ' ORDER BY full_date DESC)'
             return full_match
 
-        date_subquery_pattern = r'\(\s*SELECT\s+TOP\s+1[^)]+DIM_DATE[^)]+\)'
-        fixed_sql = re.sub(date_subquery_pattern, add_order_by_for_dates, fixed_sql, flags=re.IGNORECASE)
+        fixed_sql = _DATE_SUBQUERY_FIX_RE.sub(add_order_by_for_dates, fixed_sql)
 
         return fixed_sql
 
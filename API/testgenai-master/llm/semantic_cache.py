@@ -0,0 +1,174 @@
+"""
+Semantic cache for LLM completions.
+Embeds each prompt and answers near-duplicate (paraphrased) prompts from cache
+when cosine similarity to a previously answered prompt is above a threshold.
+Used as a second tier below the exact-match LLMCache.
+"""
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Numbers and quoted strings in a question; "top 10 branches" and "top 20 branches"
+# embed almost identically, so paraphrases only share an answer when these match exactly
+_QUESTION_LITERAL_RE = re.compile(r"\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\"")
+
+
+def question_literals(question: str) -> str:
+    """Numbers and quoted strings in a question, joined for use in a cache namespace."""
+    return ",".join(_QUESTION_LITERAL_RE.findall(question))
+
+
+class SemanticCache:
+    """FAISS inner-product index over normalized prompt embeddings, one per model."""
+
+    # Fraction of a full index evicted at once (oldest first), so removal cost is amortized
+    EVICT_FRACTION = 0.1
+
+    def __init__(self, threshold: float = 0.92, ttl: int = 3600, max_size: int = 5000,
+                 model_name: str = "all-MiniLM-L6-v2",
+                 embed_fn: Optional[Callable[[str], np.ndarray]] = None):
+        """
+        Initialize cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            ttl: Time-to-live in seconds
+            max_size: Maximum entries per model; the oldest are evicted beyond it
+            model_name: sentence-transformers model used for embeddings
+            embed_fn: Optional function returning a normalized float32 row vector for a prompt;
+                lets callers reuse an already-loaded embedder instead of loading model_name
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.model_name = model_name
+        self._embed_fn = embed_fn
+        self._encoder = None
+        self._encoder_lock = threading.Lock()
+        self._indexes: Dict[str, faiss.IndexIDMap] = {}
+        # Per model: vector id -> (prompt, response, created_at), oldest first
+        self._entries: Dict[str, "OrderedDict[int, Tuple[str, str, float]]"] = {}
+        # Per model: prompt -> vector id, so re-caching a prompt never adds a duplicate vector
+        self._ids: Dict[str, Dict[str, int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, prompt: str) -> np.ndarray:
+        """Embed a prompt as a normalized float32 row vector."""
+        if self._embed_fn is not None:
+            return self._embed_fn(prompt)
+        # Double-checked so concurrent first calls load the model only once
+        if self._encoder is None:
+            with self._encoder_lock:
+                if self._encoder is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._encoder = SentenceTransformer(self.model_name)
+        embedding = self._encoder.encode([prompt], normalize_embeddings=True)
+        return np.asarray(embedding, dtype="float32")
+
+    def get(self, model: str, prompt: str) -> Optional[str]:
+        """Get the cached response for the nearest prompt, or None on miss."""
+        with self._lock:
+            index = self._indexes.get(model)
+            if index is None or index.ntotal == 0:
+                return None
+
+        embedding = self._embed(prompt)
+
+        with self._lock:
+            index = self._indexes.get(model)
+            if index is None or index.ntotal == 0:
+                return None
+            scores, ids = index.search(embedding, 1)
+            score, vector_id = float(scores[0][0]), int(ids[0][0])
+            if vector_id < 0 or score < self.threshold:
+                return None
+
+            entry = self._entries[model].get(vector_id)
+            if entry is None:
+                return None
+            cached_prompt, response, created_at = entry
+            if time.time() - created_at > self.ttl:
+                return None
+
+        logger.info(f"Semantic cache HIT (similarity {score:.3f}) for prompt: {prompt[:50]}...")
+        return response
+
+    def _refresh(self, model: str, prompt: str, response: str) -> bool:
+        """Update an already-indexed prompt in place. Caller holds the lock."""
+        vector_id = self._ids.get(model, {}).get(prompt)
+        if vector_id is None:
+            return False
+        entries = self._entries[model]
+        entries[vector_id] = (prompt, response, time.time())
+        entries.move_to_end(vector_id)
+        return True
+
+    def _evict_oldest(self, model: str) -> None:
+        """Drop the oldest entries of a full index. Caller holds the lock."""
+        entries = self._entries[model]
+        ids = self._ids[model]
+        evict_count = max(1, int(self.max_size * self.EVICT_FRACTION))
+        evicted = []
+        while entries and len(evicted) < evict_count:
+            vector_id, (evicted_prompt, _, _) = entries.popitem(last=False)
+            del ids[evicted_prompt]
+            evicted.append(vector_id)
+        self._indexes[model].remove_ids(np.asarray(evicted, dtype="int64"))
+
+    def set(self, model: str, prompt: str, response: str) -> None:
+        """Cache a response for a prompt."""
+        with self._lock:
+            if self._refresh(model, prompt, response):
+                return
+
+        embedding = self._embed(prompt)
+
+        with self._lock:
+            # Another thread may have indexed the same prompt while we embedded it
+            if self._refresh(model, prompt, response):
+                return
+
+            index = self._indexes.get(model)
+            if index is None:
+                index = faiss.IndexIDMap(faiss.IndexFlatIP(embedding.shape[1]))
+                self._indexes[model] = index
+                self._entries[model] = OrderedDict()
+                self._ids[model] = {}
+            elif index.ntotal >= self.max_size:
+                self._evict_oldest(model)
+
+            vector_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(embedding, np.asarray([vector_id], dtype="int64"))
+            self._entries[model][vector_id] = (prompt, response, time.time())
+            self._ids[model][prompt] = vector_id
+
+    def clear(self) -> None:
+        """Clear all cached entries."""
+        with self._lock:
+            self._indexes.clear()
+            self._entries.clear()
+            self._ids.clear()
+
+
+# Global cache instance
+_semantic_cache = SemanticCache(
+    threshold=settings.semantic_cache_threshold,
+    ttl=settings.llm_cache_ttl_seconds
+)
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Get the global semantic cache instance."""
+    return _semantic_cache
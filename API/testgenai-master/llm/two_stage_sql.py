@@ -5,96 +5,71 @@ Stage 1: Identify relevant tables and columns for the query
 Stage 2: Generate SQL using ONLY those validated tables/columns
 
 This prevents hallucination by constraining the LLM to use only verified schema elements.
+By default both stages are requested in a single LLM call, falling back to two calls.
 """
 
+import re
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional
-from llm.schema_intelligence import SchemaIntelligence
-from llm.llm_core import get_llm_response
+import orjson
+from config import settings
+from llm.schema_intelligence import SchemaIntelligence, embed_query_normalized
+from llm.llm_core import get_llm_response, get_llm_response_stream
+from llm.semantic_cache import SemanticCache, question_literals
+from util.util import extract_sql_from_code_blocks
 
+logger = logging.getLogger(__name__)
 
-def get_table_column_selection_prompt(query: str, available_schemas: List[Dict]) -> str:
-    """
-    Generate prompt for Stage 1: Table and column selection.
-    """
-    schema_info = ""
-    for schema in available_schemas:
-        schema_info += f"""
-TABLE: {schema['table_name']}
-COLUMNS: {', '.join(schema['columns'])}
----
-"""
+# First fenced block holding a JSON object or array (```json tag optional)
+_JSON_BLOCK_RE = re.compile(r"```(?:json)?\s*([\[{].*?[\]}])\s*```", re.DOTALL | re.IGNORECASE)
+_SQL_BLOCK_RE = re.compile(r"```sql\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+# Runs validation of streamed SQL while the model is still emitting trailing tokens
+_validation_executor = ThreadPoolExecutor(max_workers=4)
 
-    return f"""You are a database schema expert. Your task is to identify which tables and columns are needed to answer a question.
+# Validated SQL for previously answered (and paraphrased) questions, embedded with the schema embedder
+_semantic_sql_cache = SemanticCache(
+    threshold=settings.semantic_sql_cache_threshold,
+    ttl=settings.cache_ttl_seconds,
+    embed_fn=embed_query_normalized
+)
 
-AVAILABLE TABLES AND COLUMNS:
-{schema_info}
 
-USER QUESTION: {query}
+# Static instructions for both stages are sent first (system message) so the
+# provider-side prompt cache can reuse them; only schema and question vary.
+TABLE_SELECTION_INSTRUCTIONS = """You are a database schema expert. Your task is to identify which tables and columns are needed to answer a question.
 
-TASK: Identify the EXACT tables and columns needed. ONLY use columns that exist in the list above.
+TASK: Identify the EXACT tables and columns needed. ONLY use columns that exist in the AVAILABLE TABLES AND COLUMNS list.
 
 NOTE: If this is a FOLLOW-UP question with an ORIGINAL SQL provided, make sure to include all tables from the original SQL plus any additional tables needed for the follow-up.
 
 Return your answer as JSON:
-{{
+{
     "tables": ["table1", "table2"],
-    "columns": {{
+    "columns": {
         "table1": ["col1", "col2"],
         "table2": ["col3", "col4"]
-    }},
+    },
     "joins": [
-        {{"from": "table1.col", "to": "table2.col"}}
+        {"from": "table1.col", "to": "table2.col"}
     ],
     "reasoning": "Brief explanation"
-}}
-
-CRITICAL: Only include columns that EXACTLY match the available columns listed above. Do not invent or guess column names."""
-
-
-def get_constrained_sql_prompt(
-    query: str,
-    selected_tables: List[str],
-    selected_columns: Dict[str, List[str]],
-    join_info: List[Dict],
-    full_schemas: str
-) -> str:
-    """
-    Generate prompt for Stage 2: Constrained SQL generation.
-    """
-    columns_list = ""
-    for table, cols in selected_columns.items():
-        columns_list += f"  {table}: {', '.join(cols)}\n"
-
-    joins_list = ""
-    for join in join_info:
-        joins_list += f"  - {join.get('from', '')} = {join.get('to', '')}\n"
-
-    return f"""You are an MS SQL expert. Generate a SQL query using ONLY the pre-selected tables and columns below.
-
-CONSTRAINT: You MUST use ONLY these tables and columns. Do NOT use any other columns.
-
-SELECTED TABLES: {', '.join(selected_tables)}
-
-SELECTED COLUMNS (use ONLY these):
-{columns_list}
-
-SUGGESTED JOINS:
-{joins_list}
+}
 
-FULL SCHEMA REFERENCE:
-{full_schemas}
+CRITICAL: Only include columns that EXACTLY match the available columns listed. Do not invent or guess column names."""
 
-USER QUESTION: {query}
 
-FOLLOW-UP QUESTION HANDLING:
+# SQL-writing rules shared by the constrained (stage 2) and single-pass prompts
+_SQL_GENERATION_RULES = """FOLLOW-UP QUESTION HANDLING:
 - If this contains "FOLLOW-UP QUESTION" and "ORIGINAL SQL", use the ORIGINAL SQL as your starting point
 - Modify the original SQL to answer the follow-up question
 - Keep the same table joins and structure where applicable
 - Add/modify GROUP BY, WHERE, or SELECT as needed for the follow-up
 
 CRITICAL RULES:
-1. Use ONLY columns from the SELECTED COLUMNS list above
+1. Use ONLY columns from the SELECTED COLUMNS list
 2. Use date_key columns to join with dim_date (e.g., open_date_key, inquiry_date_key)
 3. For date filtering use: DATEADD(day, -N, CAST('2024-12-31' AS DATE))
 4. NEVER use GETDATE()
@@ -116,11 +91,313 @@ IMPORTANT - NEVER SHOW IDs IN RESULTS:
 10. Instead of product_key → JOIN dim_product and show product_name or product_type
 11. Instead of competitor_key → JOIN dim_competitor and show competitor_name
 12. Instead of date_key → JOIN dim_date and show full_date or formatted date
-13. The final SELECT should contain human-readable values, NOT numeric IDs/keys
+13. The final SELECT should contain human-readable values, NOT numeric IDs/keys"""
+
+
+CONSTRAINED_SQL_INSTRUCTIONS = f"""You are an MS SQL expert. Generate a SQL query using ONLY the pre-selected tables and columns provided.
+
+CONSTRAINT: You MUST use ONLY the SELECTED TABLES and SELECTED COLUMNS. Do NOT use any other columns.
+
+{_SQL_GENERATION_RULES}
 
 Return ONLY the SQL query in a ```sql code block. No explanation."""
 
 
+# Stage 1 and Stage 2 answered in one response, saving a dependent LLM round-trip
+SINGLE_PASS_SQL_INSTRUCTIONS = f"""You are a database schema expert and MS SQL expert. Answer in TWO parts, in a single response.
+
+PART 1 - SCHEMA SELECTION: Identify the EXACT tables and columns needed. ONLY use columns that exist in the AVAILABLE TABLES AND COLUMNS list.
+Return them in a ```json code block:
+{{
+    "tables": ["table1", "table2"],
+    "columns": {{
+        "table1": ["col1", "col2"],
+        "table2": ["col3", "col4"]
+    }},
+    "joins": [
+        {{"from": "table1.col", "to": "table2.col"}}
+    ]
+}}
+
+NOTE: If this is a FOLLOW-UP question with an ORIGINAL SQL provided, make sure to include all tables from the original SQL plus any additional tables needed for the follow-up.
+
+PART 2 - SQL: Generate the SQL query. The tables and columns chosen in PART 1 are your SELECTED TABLES and SELECTED COLUMNS; do NOT use any other columns.
+
+{_SQL_GENERATION_RULES}
+
+Return the ```json block first, then the SQL query in a ```sql code block. No other explanation."""
+
+
+# Several questions answered per call; the static prefix and schema context are paid once
+BATCH_SQL_INSTRUCTIONS = f"""You are a database schema expert and MS SQL expert. You will receive several numbered questions.
+
+For EACH question: identify the EXACT tables and columns needed (ONLY columns that exist in the AVAILABLE TABLES AND COLUMNS list), then generate the SQL query. The tables and columns you choose for a question are its SELECTED TABLES and SELECTED COLUMNS; do NOT use any other columns.
+
+{_SQL_GENERATION_RULES}
+
+Return ONLY a ```json code block holding a JSON array with one object per question, in question order:
+[
+    {{
+        "index": 1,
+        "tables": ["table1", "table2"],
+        "columns": {{
+            "table1": ["col1", "col2"]
+        }},
+        "joins": [
+            {{"from": "table1.col", "to": "table2.col"}}
+        ],
+        "sql": "SELECT ..."
+    }}
+]"""
+
+
+# Per-call prompt bodies; rendered with str.format_map so only the dynamic parts are built per request
+_SELECTION_PROMPT_TEMPLATE = """AVAILABLE TABLES AND COLUMNS:
+{available_schemas}
+
+USER QUESTION: {query}"""
+
+_SINGLE_PASS_SQL_TEMPLATE = """AVAILABLE TABLES AND COLUMNS:
+{available_schemas}
+
+FULL SCHEMA REFERENCE:
+{full_schemas}
+
+USER QUESTION: {query}"""
+
+_BATCH_SQL_TEMPLATE = """AVAILABLE TABLES AND COLUMNS:
+{available_schemas}
+
+FULL SCHEMA REFERENCE:
+{full_schemas}
+
+{questions}"""
+
+_CONSTRAINED_SQL_TEMPLATE = """SELECTED TABLES: {selected_tables}
+
+SELECTED COLUMNS (use ONLY these):
+{columns_list}
+
+SUGGESTED JOINS:
+{joins_list}
+
+FULL SCHEMA REFERENCE:
+{full_schemas}
+
+USER QUESTION: {query}"""
+
+
+def _format_available_schemas(available_schemas: List[Dict]) -> str:
+    """Format retrieved schemas as the AVAILABLE TABLES AND COLUMNS listing."""
+    return "".join(
+        f"\nTABLE: {schema['table_name']}\nCOLUMNS: {', '.join(schema['columns'])}\n---\n"
+        for schema in available_schemas
+    )
+
+
+def get_table_column_selection_prompt(query: str, available_schemas: List[Dict]) -> str:
+    """
+    Generate prompt for Stage 1: Table and column selection.
+    Sent together with TABLE_SELECTION_INSTRUCTIONS as the static prefix.
+    """
+    return _SELECTION_PROMPT_TEMPLATE.format_map({
+        "available_schemas": _format_available_schemas(available_schemas),
+        "query": query,
+    })
+
+
+def get_single_pass_sql_prompt(query: str, available_schemas: List[Dict], full_schemas: str) -> str:
+    """
+    Generate prompt for combined schema selection and SQL generation.
+    Sent together with SINGLE_PASS_SQL_INSTRUCTIONS as the static prefix.
+    """
+    return _SINGLE_PASS_SQL_TEMPLATE.format_map({
+        "available_schemas": _format_available_schemas(available_schemas),
+        "full_schemas": full_schemas,
+        "query": query,
+    })
+
+
+def get_batch_sql_prompt(queries: List[str], available_schemas: List[Dict], full_schemas: str) -> str:
+    """
+    Generate prompt for answering several questions in one call.
+    Sent together with BATCH_SQL_INSTRUCTIONS as the static prefix.
+    """
+    questions = "\n".join(f"QUESTION [{i}]: {query}" for i, query in enumerate(queries, start=1))
+
+    return _BATCH_SQL_TEMPLATE.format_map({
+        "available_schemas": _format_available_schemas(available_schemas),
+        "full_schemas": full_schemas,
+        "questions": questions,
+    })
+
+
+def _parse_json_block(response: str):
+    """
+    Parse the first JSON code block (or the bare response) from an LLM response.
+
+    Raises:
+        json.JSONDecodeError: If the response holds no parseable JSON
+    """
+    match = _JSON_BLOCK_RE.search(response)
+    json_match = match.group(1) if match else response
+
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers' handlers still apply
+    return orjson.loads(json_match.strip())
+
+
+def _parse_schema_selection(response: str) -> Dict:
+    """
+    Parse the JSON table/column selection from an LLM response.
+
+    Raises:
+        json.JSONDecodeError, IndexError: If the response holds no parseable JSON object
+    """
+    selection = _parse_json_block(response)
+    if not isinstance(selection, dict):
+        raise json.JSONDecodeError("Schema selection is not a JSON object", response, 0)
+    return selection
+
+
+def _validate_generated_sql(sql_response: str, schema_intelligence: SchemaIntelligence) -> Tuple[str, bool, str]:
+    """Validate generated SQL against the schema, auto-fixing where possible."""
+    is_valid, errors = schema_intelligence.validate_sql(sql_response)
+
+    if not is_valid:
+        # Try to auto-fix
+        fixed_sql, remaining_errors = schema_intelligence.fix_invalid_sql(sql_response, errors)
+
+        if remaining_errors:
+            # Re-validate fixed SQL
+            is_valid, errors = schema_intelligence.validate_sql(fixed_sql)
+            if is_valid:
+                return fixed_sql, True, "SQL auto-corrected and validated"
+            else:
+                return fixed_sql, False, f"Validation errors: {'; '.join(errors)}"
+        else:
+            return fixed_sql, True, "SQL auto-corrected and validated"
+
+    return sql_response, True, "SQL validated successfully"
+
+
+def _early_validator(schema_intelligence: SchemaIntelligence):
+    """
+    Build an on_sql_block callback for streamed SQL responses.
+
+    Returns:
+        Tuple of (callback, early) where the callback starts validating the SQL as soon as
+        its code block closes, recording the SQL and its future in the early dict
+    """
+    early = {}
+
+    def on_sql_block(text: str) -> None:
+        sql = extract_sql_from_code_blocks(text)
+        early["sql"] = sql
+        early["future"] = _validation_executor.submit(_validate_generated_sql, sql, schema_intelligence)
+
+    return on_sql_block, early
+
+
+def _get_sql_llm_response(*args, static_prefix: str, on_sql_block=None, return_raw_response=False):
+    """get_llm_response for SQL-producing calls, streamed when enabled."""
+    if settings.enable_llm_streaming and on_sql_block is not None:
+        return get_llm_response_stream(*args, static_prefix=static_prefix, on_sql_block=on_sql_block,
+                                       return_raw_response=return_raw_response)
+    return get_llm_response(*args, static_prefix=static_prefix, return_raw_response=return_raw_response)
+
+
+def get_constrained_sql_prompt(
+    query: str,
+    selected_tables: List[str],
+    selected_columns: Dict[str, List[str]],
+    join_info: List[Dict],
+    full_schemas: str
+) -> str:
+    """
+    Generate prompt for Stage 2: Constrained SQL generation.
+    Sent together with CONSTRAINED_SQL_INSTRUCTIONS as the static prefix.
+    """
+    columns_list = "".join(f"  {table}: {', '.join(cols)}\n" for table, cols in selected_columns.items())
+    joins_list = "".join(f"  - {join.get('from', '')} = {join.get('to', '')}\n" for join in join_info)
+
+    return _CONSTRAINED_SQL_TEMPLATE.format_map({
+        "selected_tables": ", ".join(selected_tables),
+        "columns_list": columns_list,
+        "joins_list": joins_list,
+        "full_schemas": full_schemas,
+        "query": query,
+    })
+
+
+def _single_pass_sql_generation(
+    question_id: str,
+    question_type: str,
+    query: str,
+    relevant_schemas: List[Dict],
+    model: str,
+    on_sql_block=None
+) -> Optional[str]:
+    """
+    Select schema and generate SQL in one LLM call.
+
+    Returns:
+        Extracted SQL, or None when the response lacks a parseable selection or
+        ```sql block (the caller then falls back to the two-stage path)
+    """
+    table_names = [s["table_name"] for s in relevant_schemas]
+    full_schemas = "\n\n".join(s["create_statement"] for s in relevant_schemas)
+    prompt = get_single_pass_sql_prompt(query, relevant_schemas, full_schemas)
+
+    response, _ = _get_sql_llm_response(
+        question_id,
+        question_type,
+        prompt,
+        model,
+        "Combined-Schema-SQL",
+        ",".join(table_names),
+        full_schemas,
+        query,
+        None,
+        True,
+        static_prefix=SINGLE_PASS_SQL_INSTRUCTIONS,
+        on_sql_block=on_sql_block,
+        # The raw text is still needed to check the schema selection and ```sql block;
+        # the Interactions row gets the extracted SQL like the Stage 2 path
+        return_raw_response=True
+    )
+
+    try:
+        _parse_schema_selection(response)
+    except (json.JSONDecodeError, IndexError) as e:
+        logger.warning(f"Single-pass schema selection unparseable, falling back to two stages: {e}")
+        return None
+
+    if not _SQL_BLOCK_RE.search(response):
+        logger.warning("Single-pass response has no ```sql block, falling back to two stages")
+        return None
+
+    return extract_sql_from_code_blocks(response)
+
+
+def _confident_single_table(query: str, scored_schemas: List[Tuple[Dict, float]]) -> Optional[Dict]:
+    """
+    Return the top retrieved schema when it is the only strong match for the question.
+
+    The closest table must beat the runner-up by settings.single_table_distance_margin
+    (FAISS L2 distance). Follow-ups embed the original SQL and may span tables, so they
+    never qualify.
+    """
+    if not settings.enable_single_table_shortcut or "ORIGINAL SQL" in query:
+        return None
+    if len(scored_schemas) < 2:
+        return None
+
+    (best, best_distance), (_, runner_up_distance) = scored_schemas[0], scored_schemas[1]
+    if runner_up_distance - best_distance > settings.single_table_distance_margin:
+        return best
+    return None
+
+
 def two_stage_sql_generation(
     question_id: str,
     question_type: str,
@@ -131,6 +408,9 @@ def two_stage_sql_generation(
     """
     Two-stage SQL generation process.
 
+    With settings.enable_single_pass_sql both stages are answered in one LLM call;
+    the two-call path runs only when that response can't be parsed.
+
     Args:
         question_id: Unique question identifier
         question_type: Type of question
@@ -141,92 +421,200 @@ def two_stage_sql_generation(
     Returns:
         Tuple of (generated_sql, is_valid, validation_message)
     """
+    # Near-duplicate questions against the same schema snapshot reuse validated SQL.
+    # Follow-ups embed the original SQL, so they are never matched semantically.
+    use_semantic_cache = settings.enable_semantic_sql_caching and "ORIGINAL SQL" not in query
+    if use_semantic_cache:
+        cache_namespace = f"{model}|{question_type}|{schema_intelligence.schema_hash}|{question_literals(query)}"
+        normalized_query = " ".join(query.split())
+        cached_sql = _semantic_sql_cache.get(cache_namespace, normalized_query)
+        if cached_sql is not None:
+            is_valid, _ = schema_intelligence.validate_sql(cached_sql)
+            if is_valid:
+                return cached_sql, True, "SQL served from semantic cache"
+
     # Stage 1: Get relevant schemas using FAISS
-    relevant_schemas = schema_intelligence.get_relevant_schemas(query, top_k=6)
+    scored_schemas = schema_intelligence.get_relevant_schemas_with_scores(query, top_k=6)
+    relevant_schemas = [schema for schema, _ in scored_schemas]
+
+    # Streamed responses start validation as soon as the ```sql block closes
+    on_sql_block, early = _early_validator(schema_intelligence)
+
+    sql_response = None
+    single_table = _confident_single_table(query, scored_schemas)
+    if single_table is None and settings.enable_single_pass_sql:
+        sql_response = _single_pass_sql_generation(
+            question_id, question_type, query, relevant_schemas, model, on_sql_block
+        )
+
+    if sql_response is None:
+        if single_table is not None:
+            # One table clearly outranks the rest; select it without the Stage-1 call
+            selected_tables = [single_table["table_name"]]
+            selected_columns = {single_table["table_name"]: single_table["columns"]}
+            join_info = []
+        else:
+            # Stage 1: Ask LLM to select tables and columns
+            selection_prompt = get_table_column_selection_prompt(query, relevant_schemas)
+
+            selection_response, _ = get_llm_response(
+                question_id,
+                question_type,
+                selection_prompt,
+                "GPT 4",  # Use GPT-4 for better reasoning
+                "Schema-Selection-Stage-1",
+                None, None, query, None,
+                extract_sql=False,
+                static_prefix=TABLE_SELECTION_INSTRUCTIONS
+            )
+
+            # Parse the selection response
+            try:
+                selection = _parse_schema_selection(selection_response)
+                selected_tables = selection.get("tables", [])
+                selected_columns = selection.get("columns", {})
+                join_info = selection.get("joins", [])
+            except (json.JSONDecodeError, IndexError) as e:
+                # Fallback: use all relevant tables from FAISS
+                selected_tables = [s["table_name"] for s in relevant_schemas]
+                selected_columns = {s["table_name"]: s["columns"] for s in relevant_schemas}
+                join_info = []
+
+        # The model sometimes repeats a table (often in another case); keep its first spelling
+        table_names = {}
+        for table in selected_tables:
+            table_names.setdefault(table.upper(), table)
+        selected_tables = list(table_names.values())
+
+        # Validate selected columns actually exist, merging repeated tables
+        validated_columns = {}
+        for table, columns in selected_columns.items():
+            valid_cols = schema_intelligence.table_column_sets.get(table.upper())
+            if valid_cols is not None:
+                kept = validated_columns.setdefault(table_names.get(table.upper(), table), [])
+                for column in columns:
+                    if column.lower() in valid_cols and column not in kept:
+                        kept.append(column)
+
+        # Get full schema for selected tables
+        full_schemas = schema_intelligence.get_schema_context_for_tables(selected_tables)
+
+        # Stage 2: Generate SQL with constraints
+        sql_prompt = get_constrained_sql_prompt(
+            query,
+            selected_tables,
+            validated_columns,
+            join_info,
+            full_schemas
+        )
+
+        sql_response, _ = _get_sql_llm_response(
+            question_id,
+            question_type,
+            sql_prompt,
+            model,
+            "Constrained-SQL-Generation-Stage-2",
+            ",".join(selected_tables),
+            full_schemas,
+            query,
+            None,
+            True,
+            static_prefix=CONSTRAINED_SQL_INSTRUCTIONS,
+            on_sql_block=on_sql_block
+        )
+
+    # Validate the generated SQL, reusing the early validation if it saw the same SQL
+    if "future" in early and early["sql"] == sql_response:
+        result = early["future"].result()
+    else:
+        result = _validate_generated_sql(sql_response, schema_intelligence)
 
-    # Stage 1: Ask LLM to select tables and columns
-    selection_prompt = get_table_column_selection_prompt(query, relevant_schemas)
+    if use_semantic_cache and result[1]:
+        _semantic_sql_cache.set(cache_namespace, normalized_query, result[0])
 
-    selection_response, _ = get_llm_response(
-        question_id,
-        question_type,
-        selection_prompt,
-        "GPT 4",  # Use GPT-4 for better reasoning
-        "Schema-Selection-Stage-1",
-        None, None, query, None,
-        extract_sql=False
-    )
+    return result
 
-    # Parse the selection response
-    try:
-        # Extract JSON from response
-        json_match = selection_response
-        if "```json" in selection_response:
-            json_match = selection_response.split("```json")[1].split("```")[0]
-        elif "```" in selection_response:
-            json_match = selection_response.split("```")[1].split("```")[0]
-
-        selection = json.loads(json_match.strip())
-        selected_tables = selection.get("tables", [])
-        selected_columns = selection.get("columns", {})
-        join_info = selection.get("joins", [])
-    except (json.JSONDecodeError, IndexError) as e:
-        # Fallback: use all relevant tables from FAISS
-        selected_tables = [s["table_name"] for s in relevant_schemas]
-        selected_columns = {s["table_name"]: s["columns"] for s in relevant_schemas}
-        join_info = []
-
-    # Validate selected columns actually exist
-    validated_columns = {}
-    for table, columns in selected_columns.items():
-        table_upper = table.upper()
-        if table_upper in schema_intelligence.table_columns:
-            valid_cols = set(schema_intelligence.table_columns[table_upper])
-            validated_columns[table] = [c for c in columns if c.lower() in valid_cols]
-
-    # Get full schema for selected tables
-    full_schemas = schema_intelligence.get_schema_context_for_tables(selected_tables)
-
-    # Stage 2: Generate SQL with constraints
-    sql_prompt = get_constrained_sql_prompt(
-        query,
-        selected_tables,
-        validated_columns,
-        join_info,
-        full_schemas
-    )
 
-    sql_response, _ = get_llm_response(
-        question_id,
-        question_type,
-        sql_prompt,
-        model,
-        "Constrained-SQL-Generation-Stage-2",
-        ",".join(selected_tables),
-        full_schemas,
-        query,
-        None,
-        extract_sql=True
-    )
-
-    # Validate the generated SQL
-    is_valid, errors = schema_intelligence.validate_sql(sql_response)
+def two_stage_sql_generation_batch(
+    questions: List[Tuple[str, str]],
+    question_type: str,
+    schema_intelligence: SchemaIntelligence,
+    model: str = "GPT 4",
+    batch_size: int = 5
+) -> List[Tuple[str, bool, str]]:
+    """
+    Generate SQL for several questions with one LLM call per batch.
 
-    if not is_valid:
-        # Try to auto-fix
-        fixed_sql, remaining_errors = schema_intelligence.fix_invalid_sql(sql_response, errors)
+    Schemas retrieved for every question in a batch are unioned into one shared
+    context. Questions whose answer is missing from the batch response fall back
+    to two_stage_sql_generation individually.
 
-        if remaining_errors:
-            # Re-validate fixed SQL
-            is_valid, errors = schema_intelligence.validate_sql(fixed_sql)
-            if is_valid:
-                return fixed_sql, True, "SQL auto-corrected and validated"
-            else:
-                return fixed_sql, False, f"Validation errors: {'; '.join(errors)}"
-        else:
-            return fixed_sql, True, "SQL auto-corrected and validated"
+    Args:
+        questions: List of (question_id, query) pairs
+        question_type: Type of question
+        schema_intelligence: SchemaIntelligence instance
+        model: LLM model to use
+        batch_size: Maximum questions per LLM call
 
-    return sql_response, True, "SQL validated successfully"
+    Returns:
+        List of (generated_sql, is_valid, validation_message), in question order
+    """
+    results = []
+
+    for start in range(0, len(questions), batch_size):
+        batch = questions[start:start + batch_size]
+        queries = [query for _, query in batch]
+
+        # Union of each question's top schemas, deduplicated by table name
+        schemas_by_table = {}
+        for schemas in schema_intelligence.get_relevant_schemas_batch(queries, top_k=6):
+            for schema in schemas:
+                schemas_by_table.setdefault(schema["table_name"], schema)
+        relevant_schemas = list(schemas_by_table.values())
+
+        full_schemas = "\n\n".join(s["create_statement"] for s in relevant_schemas)
+        prompt = get_batch_sql_prompt(queries, relevant_schemas, full_schemas)
+
+        # Interactions reference a single question, so the batch call is logged under the first
+        response, _ = get_llm_response(
+            batch[0][0],
+            question_type,
+            prompt,
+            model,
+            "Batch-Schema-SQL",
+            ",".join(schemas_by_table),
+            full_schemas,
+            "\n".join(queries),
+            None,
+            extract_sql=False,
+            static_prefix=BATCH_SQL_INSTRUCTIONS
+        )
+
+        sql_by_index = {}
+        try:
+            answers = _parse_json_block(response)
+            for answer in answers:
+                if isinstance(answer, dict) and answer.get("sql"):
+                    sql_by_index[int(answer["index"])] = answer["sql"].strip()
+        except (json.JSONDecodeError, IndexError, KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Batch SQL response unparseable, answering questions individually: {e}")
+
+        def answer(item):
+            i, (question_id, query) = item
+            sql_response = sql_by_index.get(i)
+            if sql_response is None:
+                return two_stage_sql_generation(
+                    question_id, question_type, query, schema_intelligence, model
+                )
+            logger.info(f"Batch SQL generated for question {question_id}")
+            return _validate_generated_sql(sql_response, schema_intelligence)
+
+        # Validation/auto-fix and any per-question LLM fallbacks run concurrently;
+        # map() keeps results in question order
+        with ThreadPoolExecutor(max_workers=min(len(batch), settings.llm_concurrency)) as pool:
+            results.extend(pool.map(answer, enumerate(batch, start=1)))
+
+    return results
 
 
 def validate_and_fix_sql(
@@ -235,7 +623,8 @@ def validate_and_fix_sql(
     question_id: str,
     question_type: str,
     query: str,
-    model: str = "GPT 4"
+    model: str = "GPT 4",
+    relevant_schemas: Optional[List[Dict]] = None
 ) -> Tuple[str, bool, str]:
     """
     Validate SQL and attempt to fix if invalid.
@@ -247,6 +636,7 @@ def validate_and_fix_sql(
         question_type: Question type
         query: Original user query
         model: LLM model for regeneration
+        relevant_schemas: Schemas already retrieved for the query; looked up when omitted
 
     Returns:
         Tuple of (sql, is_valid, message)
@@ -268,8 +658,9 @@ def validate_and_fix_sql(
     # Auto-fix didn't work, regenerate with error context
     error_context = "\n".join(errors)
 
-    # Get relevant schemas for the query
-    relevant_schemas = schema_intelligence.get_relevant_schemas(query, top_k=5)
+    # Get relevant schemas for the query, unless the caller already has them
+    if relevant_schemas is None:
+        relevant_schemas = schema_intelligence.get_relevant_schemas(query, top_k=5)
     full_schemas = schema_intelligence.get_schema_context_for_tables(
         [s["table_name"] for s in relevant_schemas]
     )
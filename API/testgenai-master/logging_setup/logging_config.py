@@ -3,21 +3,46 @@ Logging Configuration for DataSense Application
 Provides structured logging with file rotation and multiple log levels
 """
 
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
 import sys
-import json
 from datetime import datetime
 from pathlib import Path
 
+import orjson
+
 
 class JSONFormatter(logging.Formatter):
     """Custom JSON formatter for structured logging"""
 
+    # (second, formatted UTC timestamp) shared by records logged within the same second;
+    # a single tuple so concurrent formatters never see a mismatched pair
+    _ts_cache = (0, "")
+
+    # (record attribute, output key) for the `extra` fields copied into the JSON line
+    EXTRA_KEYS = (
+        ('user_id', 'user_id'),
+        ('question_id', 'question_id'),
+        ('execution_time', 'execution_time_ms'),
+        ('endpoint', 'endpoint'),
+        ('status_code', 'status_code'),
+        ('client_ip', 'client_ip'),
+    )
+
+    def _format_timestamp(self, created):
+        sec = int(created)
+        cached_sec, cached_str = JSONFormatter._ts_cache
+        if sec != cached_sec:
+            cached_str = datetime.utcfromtimestamp(sec).isoformat()
+            JSONFormatter._ts_cache = (sec, cached_str)
+        return f"{cached_str}.{int((created - sec) * 1000):03d}"
+
     def format(self, record):
         log_data = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': self._format_timestamp(record.created),
             'level': record.levelname,
             'logger': record.name,
             'message': record.getMessage(),
@@ -31,20 +56,15 @@ class JSONFormatter(logging.Formatter):
             log_data['exception'] = self.formatException(record.exc_info)
 
         # Add extra fields if present
-        if hasattr(record, 'user_id'):
-            log_data['user_id'] = record.user_id
-        if hasattr(record, 'question_id'):
-            log_data['question_id'] = record.question_id
-        if hasattr(record, 'execution_time'):
-            log_data['execution_time_ms'] = record.execution_time
-        if hasattr(record, 'endpoint'):
-            log_data['endpoint'] = record.endpoint
-        if hasattr(record, 'status_code'):
-            log_data['status_code'] = record.status_code
-        if hasattr(record, 'client_ip'):
-            log_data['client_ip'] = record.client_ip
-
-        return json.dumps(log_data)
+        record_dict = record.__dict__
+        log_data.update({
+            output_key: record_dict[key]
+            for key, output_key in self.EXTRA_KEYS
+            if key in record_dict
+        })
+
+        # orjson emits bytes; default=str covers any non-JSON extra values
+        return orjson.dumps(log_data, default=str).decode()
 
 
 class ColoredFormatter(logging.Formatter):
@@ -66,12 +86,69 @@ class ColoredFormatter(logging.Formatter):
         return super().format(record)
 
 
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for an in-process queue.
+    Records are enqueued as-is so the listener-side formatters still see
+    args and exc_info (the default prepare() flattens both into the message).
+    """
+
+    def prepare(self, record):
+        return record
+
+
+# Background listeners doing formatting and file IO off the logging threads
+_queue_listeners = []
+
+
+def _stop_queue_listeners():
+    """Flush and stop all queue listeners."""
+    while _queue_listeners:
+        _queue_listeners.pop().stop()
+
+
+atexit.register(_stop_queue_listeners)
+
+
+def _queue_handler(*handlers: logging.Handler) -> logging.Handler:
+    """Front the given handlers with a queue drained by a background listener thread."""
+    log_queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _queue_listeners.append(listener)
+    return _LocalQueueHandler(log_queue)
+
+
+def _file_handler(
+    filename: Path,
+    max_bytes: int,
+    backup_count: int,
+    external_rotation: bool
+) -> logging.Handler:
+    """
+    Create a log file handler that opens its file on first write.
+
+    With external rotation (e.g. logrotate) a WatchedFileHandler only reopens the
+    file when it has been moved; otherwise Python rotates by size.
+    """
+    if external_rotation:
+        return logging.handlers.WatchedFileHandler(filename, encoding='utf-8', delay=True)
+    return logging.handlers.RotatingFileHandler(
+        filename=filename,
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        encoding='utf-8',
+        delay=True
+    )
+
+
 def setup_logging(
     log_dir: str = "logs",
     log_level: str = "INFO",
     enable_console: bool = True,
     enable_json: bool = True,
-    enable_colored_console: bool = True
+    enable_colored_console: bool = True,
+    external_rotation: bool = False
 ):
     """
     Setup comprehensive logging configuration
@@ -81,7 +158,9 @@ def setup_logging(
         log_level: Minimum log level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         enable_console: Whether to log to console
         enable_json: Whether to use JSON formatting for file logs
-        enable_colored_console: Whether to use colored output in console
+        enable_colored_console: Whether to use colored output in console (only applied when stdout is a TTY)
+        external_rotation: Whether log files are rotated externally (e.g. logrotate)
+            instead of by size in-process
     """
 
     # Create logs directory
@@ -97,17 +176,22 @@ def setup_logging(
 
     # Remove existing handlers
     root_logger.handlers.clear()
+    _stop_queue_listeners()
+
+    # File (and console) handlers run on background listener threads; loggers only
+    # enqueue records. Root handlers share one queue so they keep their order.
+    root_handlers = []
 
     # ========================================================================
     # File Handlers
     # ========================================================================
 
     # 1. General Application Log (Rotating)
-    app_handler = logging.handlers.RotatingFileHandler(
-        filename=log_path / 'datasense.log',
-        maxBytes=10 * 1024 * 1024,  # 10MB
-        backupCount=5,
-        encoding='utf-8'
+    app_handler = _file_handler(
+        log_path / 'datasense.log',
+        max_bytes=10 * 1024 * 1024,  # 10MB
+        backup_count=5,
+        external_rotation=external_rotation
     )
     app_handler.setLevel(logging.INFO)
 
@@ -118,14 +202,14 @@ def setup_logging(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         ))
 
-    root_logger.addHandler(app_handler)
+    root_handlers.append(app_handler)
 
     # 2. Error Log (Only errors and critical)
-    error_handler = logging.handlers.RotatingFileHandler(
-        filename=log_path / 'error.log',
-        maxBytes=10 * 1024 * 1024,  # 10MB
-        backupCount=5,
-        encoding='utf-8'
+    error_handler = _file_handler(
+        log_path / 'error.log',
+        max_bytes=10 * 1024 * 1024,  # 10MB
+        backup_count=5,
+        external_rotation=external_rotation
     )
     error_handler.setLevel(logging.ERROR)
 
@@ -138,14 +222,14 @@ def setup_logging(
             'Function: %(funcName)s\n'
         ))
 
-    root_logger.addHandler(error_handler)
+    root_handlers.append(error_handler)
 
     # 3. API Request/Response Log
-    api_handler = logging.handlers.RotatingFileHandler(
-        filename=log_path / 'api_requests.log',
-        maxBytes=20 * 1024 * 1024,  # 20MB
-        backupCount=10,
-        encoding='utf-8'
+    api_handler = _file_handler(
+        log_path / 'api_requests.log',
+        max_bytes=20 * 1024 * 1024,  # 20MB
+        backup_count=10,
+        external_rotation=external_rotation
     )
     api_handler.setLevel(logging.INFO)
     api_handler.setFormatter(JSONFormatter())
@@ -153,15 +237,16 @@ def setup_logging(
     # Create API logger
     api_logger = logging.getLogger('api')
     api_logger.setLevel(logging.INFO)
-    api_logger.addHandler(api_handler)
+    api_logger.handlers.clear()
+    api_logger.addHandler(_queue_handler(api_handler))
     api_logger.propagate = False  # Don't propagate to root
 
     # 4. SQL Query Log
-    sql_handler = logging.handlers.RotatingFileHandler(
-        filename=log_path / 'sql_queries.log',
-        maxBytes=15 * 1024 * 1024,  # 15MB
-        backupCount=7,
-        encoding='utf-8'
+    sql_handler = _file_handler(
+        log_path / 'sql_queries.log',
+        max_bytes=15 * 1024 * 1024,  # 15MB
+        backup_count=7,
+        external_rotation=external_rotation
     )
     sql_handler.setLevel(logging.DEBUG)
     sql_handler.setFormatter(JSONFormatter())
@@ -169,15 +254,16 @@ def setup_logging(
     # Create SQL logger
     sql_logger = logging.getLogger('sql')
     sql_logger.setLevel(logging.DEBUG)
-    sql_logger.addHandler(sql_handler)
+    sql_logger.handlers.clear()
+    sql_logger.addHandler(_queue_handler(sql_handler))
     sql_logger.propagate = False
 
     # 5. Performance/Metrics Log
-    perf_handler = logging.handlers.RotatingFileHandler(
-        filename=log_path / 'performance.log',
-        maxBytes=10 * 1024 * 1024,  # 10MB
-        backupCount=5,
-        encoding='utf-8'
+    perf_handler = _file_handler(
+        log_path / 'performance.log',
+        max_bytes=10 * 1024 * 1024,  # 10MB
+        backup_count=5,
+        external_rotation=external_rotation
     )
     perf_handler.setLevel(logging.INFO)
     perf_handler.setFormatter(JSONFormatter())
@@ -185,7 +271,8 @@ def setup_logging(
     # Create performance logger
     perf_logger = logging.getLogger('performance')
     perf_logger.setLevel(logging.INFO)
-    perf_logger.addHandler(perf_handler)
+    perf_logger.handlers.clear()
+    perf_logger.addHandler(_queue_handler(perf_handler))
     perf_logger.propagate = False
 
     # ========================================================================
@@ -196,7 +283,8 @@ def setup_logging(
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(logging.INFO)
 
-        if enable_colored_console:
+        # ANSI colors only help on a terminal; redirected output gets plain level names
+        if enable_colored_console and sys.stdout.isatty():
             console_handler.setFormatter(ColoredFormatter(
                 '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                 datefmt='%Y-%m-%d %H:%M:%S'
@@ -207,7 +295,9 @@ def setup_logging(
                 datefmt='%Y-%m-%d %H:%M:%S'
             ))
 
-        root_logger.addHandler(console_handler)
+        root_handlers.append(console_handler)
+
+    root_logger.addHandler(_queue_handler(*root_handlers))
 
     # ========================================================================
     # Configure Third-Party Library Loggers
@@ -271,8 +361,11 @@ def log_api_request(
 ):
     """Log API request with structured data"""
     logger = get_api_logger()
+    if not logger.isEnabledFor(logging.INFO):
+        return
+
     logger.info(
-        f"{method} {endpoint}",
+        "%s %s", method, endpoint,
         extra={
             'endpoint': endpoint,
             'method': method,
@@ -296,10 +389,12 @@ def log_sql_query(
     logger = get_sql_logger()
 
     log_level = logging.ERROR if error else logging.INFO
+    if not logger.isEnabledFor(log_level):
+        return
 
     logger.log(
         log_level,
-        f"SQL Query Executed: {query[:100]}...",
+        "SQL Query Executed: %.100s...", query,
         extra={
             'query': query,
             'execution_time': execution_time,
@@ -318,6 +413,8 @@ def log_performance_metric(
 ):
     """Log performance metrics"""
     logger = get_performance_logger()
+    if not logger.isEnabledFor(logging.INFO):
+        return
 
     extra = {
         'operation': operation,
@@ -327,7 +424,7 @@ def log_performance_metric(
     if metadata:
         extra.update(metadata)
 
-    logger.info(f"Performance: {operation}", extra=extra)
+    logger.info("Performance: %s", operation, extra=extra)
 
 
 # Initialize logging on module import (optional)
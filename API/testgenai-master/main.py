@@ -1,5 +1,5 @@
 from fastapi import FastAPI, HTTPException, Request, Depends, Header, UploadFile, BackgroundTasks
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from models.request_models import QuestionRequestModel, FollowUpQuestionRequestModel, UserHistoryRequestModel, UserHistoryQuestionRequestModel, RelatedQuestionRequestModel, DislikeQuestionRequestModel, DeleteQuestionRequestModel, RenameQuestionRequestModel, SharedHistoryQuestionRequestModel, UserValidationRequestModel, QuestionTagsRequestModel, ChartsRequestModel, ChartEditRequestModel, ChartOptionsRequestModel, ChartOptionsEditRequestModel, ChartOptionsSaveEditedRequestModel, TrendingQuestionsRequestModel
@@ -7,11 +7,12 @@ from self_db import create_question, get_user_history_question, get_user_history
 from app_init.init_app import create_vector_store, create_rag_vector_store
 from llm import api_handlers
 from llm.response_cache import get_response_cache
-from llm.async_handlers import run_in_executor, get_tags_async, get_related_questions_async, get_additional_insights_async
+from llm.async_handlers import run_in_executor, run_db_in_executor, get_tags_async, get_related_questions_async, get_additional_insights_async
 from llm.demo_responses import preload_demo_cache, get_demo_sql
 from self_db import get_db
 import asyncio
 import time, json
+import orjson
 from datetime import datetime
 from langchain_community.document_loaders import PyPDFLoader
 import shutil
@@ -32,7 +33,8 @@ setup_logging(
     log_level=os.getenv("LOG_LEVEL", "INFO"),
     enable_console=True,
     enable_json=True,
-    enable_colored_console=True
+    enable_colored_console=True,
+    external_rotation=os.getenv("LOG_EXTERNAL_ROTATION", "false").lower() == "true"
 )
 
 # Get logger for this module
@@ -50,20 +52,33 @@ vector_store_from_metadata_two, create_statement_dict_two = create_vector_store(
 
 rag_vector_store = create_rag_vector_store()
 
-def select_vector_version(version: str):
-    if version == 'v2' or version == 'v3' or version == 'v4':
-        return vector_store_from_metadata_two, create_statement_dict_two
-    else:
-        # Default to v2 for any other version (v1, etc.)
-        return vector_store_from_metadata_two, create_statement_dict_two
-    
-def select_model(version: str):
-    if version == 'v1' or version == 'v2':
-        return 'GPT 4'
-    elif version == 'v3':
-        return 'GPT 3.5'
-    elif version == 'v4':
-        return 'Deep Seek 33B'
+# Every API version uses the v2 vector store
+VECTOR_STORE = (vector_store_from_metadata_two, create_statement_dict_two)
+
+# Model per API version; unknown versions fall back to GPT 4 like v1/v2
+MODEL_BY_VERSION = {
+    'v1': 'GPT 4',
+    'v2': 'GPT 4',
+    'v3': 'GPT 3.5',
+    'v4': 'Deep Seek 33B',
+}
+
+
+ANSWERED_AT_FORMAT = "%B %d, %Y, %H:%M:%S"
+ANSWERED_AT_FORMAT_WITH_AT = "%B %d, %Y, at %H:%M:%S"
+
+# format -> (epoch second, formatted string); strftime runs at most once per second per format
+_answered_at_cache = {}
+
+
+def answered_at_now(fmt: str = ANSWERED_AT_FORMAT) -> str:
+    """Current local time formatted for the answered_at field."""
+    sec = int(time.time())
+    cached = _answered_at_cache.get(fmt)
+    if cached is None or cached[0] != sec:
+        cached = (sec, datetime.fromtimestamp(sec).strftime(fmt))
+        _answered_at_cache[fmt] = cached
+    return cached[1]
    
     
 # TEMP api keys until we implement proper auth
@@ -94,6 +109,9 @@ user_api_map = dict(zip(user_ids, api_keys_30))
 # To create a reverse mapping (API key to user ID)
 api_user_map = {v: k for k, v in user_api_map.items()}
 
+# Every mapped key belongs to a user in the 300-330 range, so auth is a single set lookup
+VALID_API_KEYS = frozenset(api_user_map)
+
 # Function to get API key by user ID
 def get_api_key_for_user(user_id):
     return user_api_map.get(user_id)
@@ -106,8 +124,7 @@ def get_api_key(authorization: str = Header(None)):
     if authorization is None or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="API key missing or invalid")
     api_key = authorization[7:]  # Extract the key part from "Bearer YOUR_API_KEY"
-    user_id = get_user_id(api_key)
-    if user_id is None or user_id < 300 or user_id > 330:
+    if api_key not in VALID_API_KEYS:
         raise HTTPException(status_code=401, detail="API key invalid")    
     return api_key
 
@@ -118,7 +135,8 @@ def get_api_key(authorization: str = Header(None)):
 app = FastAPI(
     title="DataSense API",
     description="AI-powered data analysis and SQL query generation",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
 origins = ["*"]
@@ -140,11 +158,18 @@ app.add_middleware(PerformanceLoggingMiddleware, slow_request_threshold_ms=1000.
 
 logger.info("FastAPI application initialized with logging middleware")
 
+# Process-wide response cache, bound once instead of fetched per request
+RESPONSE_CACHE = get_response_cache()
+
 # Preload demo responses into cache
-demo_cache = get_response_cache()
-preload_demo_cache(demo_cache)
+preload_demo_cache(RESPONSE_CACHE)
 logger.info("Demo responses preloaded into cache")
 
+@app.on_event("startup")
+async def warm_connections():
+    from llm.llm_core import warm_llm_connections
+    await warm_llm_connections()
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     if exc.status_code == 404:
@@ -157,11 +182,23 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     #return await request.app.default_exception_handler(request, exc)
     return JSONResponse({"detail": "Something went wrong!"}, status_code=exc.status_code)
 
+# Protocol errors raised when a client disconnects mid-response
+try:
+    from h11 import LocalProtocolError as _H11LocalProtocolError, RemoteProtocolError as _H11RemoteProtocolError
+    _CLIENT_DISCONNECT_ERRORS = (_H11LocalProtocolError, _H11RemoteProtocolError)
+except ImportError:
+    _CLIENT_DISCONNECT_ERRORS = ()
+try:
+    from httpcore import LocalProtocolError as _HttpcoreLocalProtocolError
+    _CLIENT_DISCONNECT_ERRORS += (_HttpcoreLocalProtocolError,)
+except ImportError:
+    pass
+
 # Handle h11 protocol errors gracefully (client disconnections)
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
     # Check if it's an h11 LocalProtocolError (client disconnected)
-    if "h11" in str(type(exc).__module__) or "LocalProtocolError" in str(type(exc).__name__):
+    if isinstance(exc, _CLIENT_DISCONNECT_ERRORS):
         logger.warning(f"Client disconnected during request: {request.url.path}")
         # Don't try to send a response - client is gone
         return None
@@ -192,7 +229,8 @@ async def answer_original_question(request_data: QuestionRequestModel, version:
 
             # Execute the cached SQL
             cached_sql = demo_sql_data.get("sql", "").strip()
-            result, columns, error = execute_query_original(
+            result, columns, error = await run_db_in_executor(
+                execute_query_original,
                 question_id, question_type, "Demo-Cache",
                 cached_sql, query_from_llm=True
             )
@@ -201,24 +239,25 @@ async def answer_original_question(request_data: QuestionRequestModel, version:
             if not error and result and len(result) > 0:
                 # Format the database output
                 db_output = json.dumps(result)
-                formatted_output = format_db_output(
+                formatted_output = await run_in_executor(
+                    format_db_output,
                     question_id, question_type, db_output,
                     question_asked, "Demo-Cache"
                 )
 
-                answered_at = datetime.now().strftime("%B %d, %Y, %H:%M:%S")
+                answered_at = answered_at_now()
                 time_taken = time.time() - start_time
 
                 # Save to history
                 try:
-                    create_question(db, user_id, question_id, question_type, None, question_asked)
-                    update_question(user_id, question_id, question_type, round(time_taken, 2),
+                    await run_db_in_executor(create_question, db, user_id, question_id, question_type, None, question_asked)
+                    await run_db_in_executor(update_question, user_id, question_id, question_type, round(time_taken, 2),
                                   True, formatted_output, cached_sql, answered_at,
                                   demo_sql_data.get("show_chart", 1), demo_sql_data.get("show_sql", 1))
                 except Exception as e:
                     logger.warning(f"Failed to save demo question to history: {e}")
 
-                return {
+                return ORJSONResponse({
                     "question_id": question_id,
                     "sql": cached_sql,
                     "answer": formatted_output,
@@ -227,18 +266,17 @@ async def answer_original_question(request_data: QuestionRequestModel, version:
                     "show_sql": demo_sql_data.get("show_sql", 1),
                     "cached": True,
                     "demo_mode": True
-                }
+                })
             else:
                 # Demo SQL returned no data or error, fall through to LLM
                 logger.info(f"Demo SQL returned no data or error, falling through to LLM")
 
         # Check response cache for faster response (runtime cache)
-        cache = get_response_cache()
-        cached_response = cache.get(question_asked, "original")
+        cached_response = RESPONSE_CACHE.get(question_asked, "original")
         if cached_response:
             logger.info(f"Cache hit for question: {question_asked[:50]}...")
-            answered_at = datetime.now().strftime("%B %d, %Y, %H:%M:%S")
-            return {
+            answered_at = answered_at_now()
+            return ORJSONResponse({
                 "question_id": question_id,
                 "sql": cached_response.get("sql"),
                 "answer": cached_response.get("answer"),
@@ -246,20 +284,20 @@ async def answer_original_question(request_data: QuestionRequestModel, version:
                 "show_chart": cached_response.get("show_chart", 0),
                 "show_sql": cached_response.get("show_sql", 0),
                 "cached": True
-            }
+            })
 
         # Insert the question first for logging purposes
         try:
-            create_question(db, user_id, question_id, question_type, None, question_asked)
+            await run_db_in_executor(create_question, db, user_id, question_id, question_type, None, question_asked)
         except ValueError as e:
             logger.error(f"Error saving question: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error while saving question: {str(e)}")
 
-        vector_store_from_metadata, create_statement_dict = select_vector_version(version)
-        model_to_use = select_model(version)
+        vector_store_from_metadata, create_statement_dict = VECTOR_STORE
+        model_to_use = MODEL_BY_VERSION.get(version, "GPT 4")
 
         # Run the question processing in executor (non-blocking)
-        extracted_sql, formatted_output, found_matching_sql, show_chart, show_sql = await run_in_executor(
+        extracted_sql, formatted_output, found_matching_sql, show_chart, show_sql, had_error = await run_in_executor(
             api_handlers.original_question_response,
             question_id, question_type, question_asked,
             vector_store_from_metadata, create_statement_dict,
@@ -268,29 +306,29 @@ async def answer_original_question(request_data: QuestionRequestModel, version:
         )
 
         # Check if the final database response is an error
-        if formatted_output and 'ran into error' in formatted_output:
+        if had_error:
             logger.error(f"Query execution failed for question_id {question_id}: {formatted_output}")
             raise HTTPException(status_code=500, detail=f"Failed to execute query: {formatted_output}")
 
         time_taken = time.time() - start_time
 
         # Update the question with the time_taken now
-        answered_at = datetime.now().strftime("%B %d, %Y, %H:%M:%S")
+        answered_at = answered_at_now()
         try:
-            update_question(user_id, question_id, question_type, round(time_taken, 2), found_matching_sql, formatted_output, extracted_sql, answered_at, show_chart, show_sql)
+            await run_db_in_executor(update_question, user_id, question_id, question_type, round(time_taken, 2), found_matching_sql, formatted_output, extracted_sql, answered_at, show_chart, show_sql)
         except ValueError as e:
             logger.error(f"Error updating question: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error while updating question: {str(e)}")
 
         # Cache the successful response
-        cache.set(question_asked, {
+        RESPONSE_CACHE.set(question_asked, {
             "sql": extracted_sql,
             "answer": formatted_output,
             "show_chart": show_chart,
             "show_sql": show_sql
         }, "original", ttl=3600)
 
-        return {"question_id": question_id, "sql": extracted_sql, "answer": formatted_output, "answered_at": answered_at, "show_chart": show_chart, "show_sql": show_sql}
+        return ORJSONResponse({"question_id": question_id, "sql": extracted_sql, "answer": formatted_output, "answered_at": answered_at, "show_chart": show_chart, "show_sql": show_sql})
 
     except HTTPException:
         raise
@@ -320,24 +358,26 @@ async def answer_additional_insights(request_data: QuestionRequestModel, version
             insight_sql_data = get_demo_sql(demo_insight_question)
             if insight_sql_data:
                 cached_sql = insight_sql_data.get("sql", "").strip()
-                result, columns, error = execute_query_original(
+                result, columns, error = await run_db_in_executor(
+                    execute_query_original,
                     question_id, question_type, "Demo-Insight",
                     cached_sql, query_from_llm=True
                 )
 
                 if not error and result and len(result) > 0:
                     db_output = json.dumps(result)
-                    formatted_output = format_db_output(
+                    formatted_output = await run_in_executor(
+                        format_db_output,
                         question_id, question_type, db_output,
                         demo_insight_question, "Demo-Insight"
                     )
 
-                    answered_at = datetime.now().strftime("%B %d, %Y, at %H:%M:%S")
+                    answered_at = answered_at_now(ANSWERED_AT_FORMAT_WITH_AT)
                     time_taken = time.time() - start_time
 
                     try:
-                        create_question(db, user_id, question_id, question_type, None, question_asked)
-                        update_question(user_id, question_id, question_type, round(time_taken, 2),
+                        await run_db_in_executor(create_question, db, user_id, question_id, question_type, None, question_asked)
+                        await run_db_in_executor(update_question, user_id, question_id, question_type, round(time_taken, 2),
                                       True, formatted_output, cached_sql, answered_at, None, None)
                     except Exception as e:
                         logger.warning(f"Failed to save demo insight to history: {e}")
@@ -355,11 +395,10 @@ async def answer_additional_insights(request_data: QuestionRequestModel, version
                     logger.info(f"Demo insight SQL returned no data, falling through to LLM")
 
         # Check runtime cache
-        cache = get_response_cache()
-        cached_response = cache.get(question_asked, "insights")
+        cached_response = RESPONSE_CACHE.get(question_asked, "insights")
         if cached_response:
             logger.info(f"Cache hit for insights: {question_asked[:50]}...")
-            answered_at = datetime.now().strftime("%B %d, %Y, at %H:%M:%S")
+            answered_at = answered_at_now(ANSWERED_AT_FORMAT_WITH_AT)
             return {
                 "question_id": question_id,
                 "sql": cached_response.get("sql"),
@@ -369,37 +408,37 @@ async def answer_additional_insights(request_data: QuestionRequestModel, version
             }
 
         try:
-            create_question(db, user_id, question_id, question_type, None, question_asked)
+            await run_db_in_executor(create_question, db, user_id, question_id, question_type, None, question_asked)
         except ValueError as e:
             logger.error(f"Error saving question for insights: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error while saving question: {str(e)}")
 
-        vector_store_from_metadata, create_statement_dict = select_vector_version(version)
-        model_to_use = select_model(version)
+        vector_store_from_metadata, create_statement_dict = VECTOR_STORE
+        model_to_use = MODEL_BY_VERSION.get(version, "GPT 4")
 
         # Run async
-        extracted_sql, formatted_output = await run_in_executor(
+        extracted_sql, formatted_output, had_error = await run_in_executor(
             api_handlers.additional_insights_response,
             question_id, question_type, question_asked,
             vector_store_from_metadata, create_statement_dict, model_to_use
         )
 
         # Check if the final database response is an error
-        if formatted_output and 'ran into error' in formatted_output:
+        if had_error:
             raise HTTPException(status_code=500, detail="Failed to execute query after several attempts.")
 
         time_taken = time.time() - start_time
 
         # Update the question with the time_taken now
-        answered_at = datetime.now().strftime("%B %d, %Y, at %H:%M:%S")
+        answered_at = answered_at_now(ANSWERED_AT_FORMAT_WITH_AT)
         try:
-            update_question(user_id, question_id, question_type, round(time_taken, 2), False, formatted_output, extracted_sql, answered_at, None, None)
+            await run_db_in_executor(update_question, user_id, question_id, question_type, round(time_taken, 2), False, formatted_output, extracted_sql, answered_at, None, None)
         except ValueError as e:
             logger.error(f"Error updating question for insights: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error while updating question: {str(e)}")
 
         # Cache the response
-        cache.set(question_asked, {"sql": extracted_sql, "answer": formatted_output}, "insights", ttl=3600)
+        RESPONSE_CACHE.set(question_asked, {"sql": extracted_sql, "answer": formatted_output}, "insights", ttl=3600)
 
         return {"question_id": question_id, "sql": extracted_sql, "answer": formatted_output, "answered_at": answered_at}
 
@@ -426,19 +465,18 @@ async def get_related_questions(request_data: RelatedQuestionRequestModel, versi
         return {"related_questions": demo_related, "cached": True, "demo_mode": True}
 
     # Check cache
-    cache = get_response_cache()
-    cached_response = cache.get(question_asked, "related")
+    cached_response = RESPONSE_CACHE.get(question_asked, "related")
     if cached_response:
         logger.info(f"Cache hit for related questions: {question_asked[:50]}...")
         return {"related_questions": cached_response, "cached": True}
 
     try:
-        create_question(db, user_id, question_id, question_type, None, question_asked)
+        await run_db_in_executor(create_question, db, user_id, question_id, question_type, None, question_asked)
     except ValueError as e:
         return {"message": "Error while saving question", "error": str(e)}
 
-    vector_store_from_metadata, create_statement_dict = select_vector_version(version)
-    model_to_use = select_model(version)
+    vector_store_from_metadata, create_statement_dict = VECTOR_STORE
+    model_to_use = MODEL_BY_VERSION.get(version, "GPT 4")
 
     # Run async
     related_questions = await run_in_executor(
@@ -450,12 +488,12 @@ async def get_related_questions(request_data: RelatedQuestionRequestModel, versi
     time_taken = time.time() - start_time
 
     try:
-        update_question(user_id, question_id, question_type, round(time_taken, 2), False, None, None, None, None, None)
+        await run_db_in_executor(update_question, user_id, question_id, question_type, round(time_taken, 2), False, None, None, None, None, None)
     except ValueError as e:
         return {"message": "Error while updating question", "error": str(e)}
 
     # Cache the response
-    cache.set(question_asked, related_questions, "related", ttl=3600)
+    RESPONSE_CACHE.set(question_asked, related_questions, "related", ttl=3600)
 
     return {"related_questions": related_questions}
 
@@ -472,31 +510,31 @@ async def answer_follow_up_question(request_data: FollowUpQuestionRequestModel,
     # No demo SQL check for follow-up questions - always use LLM with parent context
     # Insert the question first for logging purposes
     try:
-        create_question(db, user_id, question_id, question_type, parent_question_id, question_asked)
+        await run_db_in_executor(create_question, db, user_id, question_id, question_type, parent_question_id, question_asked)
     except ValueError as e:
         return {"message": "Error while saving question", "error": str(e)}
 
-    vector_store_from_metadata, create_statement_dict = select_vector_version(version)
-    model_to_use = select_model(version)
+    vector_store_from_metadata, create_statement_dict = VECTOR_STORE
+    model_to_use = MODEL_BY_VERSION.get(version, "GPT 4")
 
     # Run async
-    extracted_sql, formatted_output, show_chart, show_sql = await run_in_executor(
+    extracted_sql, formatted_output, show_chart, show_sql, had_error = await run_in_executor(
         api_handlers.followup_question_response,
         question_id, question_type, parent_question_id, question_asked,
         vector_store_from_metadata, create_statement_dict, model_to_use, rag_vector_store
     )
 
     # Check if the final database response is an error
-    if formatted_output and 'ran into error' in formatted_output:
+    if had_error:
         raise HTTPException(status_code=500, detail="Failed to execute query after several attempts.")
 
     time_taken = time.time() - start_time
 
     # Update the question with the time_taken now
-    answered_at = datetime.now().strftime("%B %d, %Y, at %H:%M:%S")
+    answered_at = answered_at_now(ANSWERED_AT_FORMAT_WITH_AT)
     try:
-        update_question(user_id, question_id, question_type, round(time_taken, 2), False, formatted_output, extracted_sql, answered_at, show_chart, show_sql)
-        update_question_updated_at(parent_question_id, user_id)
+        await run_db_in_executor(update_question, user_id, question_id, question_type, round(time_taken, 2), False, formatted_output, extracted_sql, answered_at, show_chart, show_sql)
+        await run_db_in_executor(update_question_updated_at, parent_question_id, user_id)
     except ValueError as e:
         return {"message": "Error while updating question", "error": str(e)}
 
@@ -508,79 +546,78 @@ async def get_question_tags(request_data: QuestionTagsRequestModel, api_key: str
     question_id = request_data.question_id
 
     # Check cache
-    cache = get_response_cache()
-    cached_tags = cache.get(question_id, "tags")
+    cached_tags = RESPONSE_CACHE.get(question_id, "tags")
     if cached_tags:
         return cached_tags
 
     tags = await run_in_executor(api_handlers.get_tags, question_id)
 
     try:
-        update_question_tags(question_id, tags)
+        await run_db_in_executor(update_question_tags, question_id, tags)
     except ValueError as e:
         return {"message": "Error while updating question", "error": str(e)}
 
     # Cache the tags
     if tags:
-        cache.set(question_id, tags, "tags", ttl=7200)
+        RESPONSE_CACHE.set(question_id, tags, "tags", ttl=7200)
 
     return tags
 
 
 @app.post("/{version}/user-history")
-def read_user_history(request_data: UserHistoryRequestModel, api_key: str = Depends(get_api_key)):  
+async def read_user_history(request_data: UserHistoryRequestModel, api_key: str = Depends(get_api_key)):  
     user_id = request_data.user_id
-    history = get_user_history(user_id)   
-    return history
+    history = await run_db_in_executor(get_user_history, user_id)
+    return ORJSONResponse(history)
 
 @app.post("/{version}/user-history-question")
-def read_history_for_question_id(request_data: UserHistoryQuestionRequestModel, api_key: str = Depends(get_api_key)):
+async def read_history_for_question_id(request_data: UserHistoryQuestionRequestModel, api_key: str = Depends(get_api_key)):
     user_id = request_data.user_id
     question_id = request_data.question_id
-    history = get_user_history_question(user_id, question_id)   
+    history = await run_db_in_executor(get_user_history_question, user_id, question_id)
     return history
 
 @app.post("/{version}/shared-story-history-question")
-def read_shared_story_history_for_question_id(request_data: SharedHistoryQuestionRequestModel, api_key: str = Depends(get_api_key)):    
+async def read_shared_story_history_for_question_id(request_data: SharedHistoryQuestionRequestModel, api_key: str = Depends(get_api_key)):    
     question_id = request_data.question_id
-    story = get_shared_story_history_question(question_id)   
+    story = await run_db_in_executor(get_shared_story_history_question, question_id)
     return story
 
 @app.post("/{version}/trending-questions")
-def read_trending_questions(request_data: TrendingQuestionsRequestModel = None, api_key: str = Depends(get_api_key)):
+async def read_trending_questions(request_data: TrendingQuestionsRequestModel = None, api_key: str = Depends(get_api_key)):
     if request_data and request_data.database_name:
-        trending_questions = get_trending_questions_by_database(request_data.database_name)
+        trending_questions = await run_db_in_executor(get_trending_questions_by_database, request_data.database_name)
     else:
-        trending_questions = get_trending_questions()
-    return trending_questions
+        trending_questions = await run_db_in_executor(get_trending_questions)
+    return ORJSONResponse(trending_questions)
 
 
 @app.get("/{version}/databases")
-def list_databases(api_key: str = Depends(get_api_key)):
+async def list_databases(api_key: str = Depends(get_api_key)):
     """
     Get all available databases from SQL Server.
     Returns a list of database names that users can query.
     """
-    databases = get_all_databases()
+    databases = await run_db_in_executor(get_all_databases)
     return {"databases": databases}
 
 @app.post("/{version}/rename")
-def read_history_for_question_id(request_data: RenameQuestionRequestModel, api_key: str = Depends(get_api_key)):     
+async def read_history_for_question_id(request_data: RenameQuestionRequestModel, api_key: str = Depends(get_api_key)):     
     new_name = request_data.new_name
     user_id = request_data.user_id
     question_id = request_data.question_id    
-    rename_question(user_id, question_id, new_name)   
+    await run_db_in_executor(rename_question, user_id, question_id, new_name)
     return 'ok'
 
 @app.post("/{version}/delete")
-def read_history_for_question_id(request_data: DeleteQuestionRequestModel, api_key: str = Depends(get_api_key)):         
+async def read_history_for_question_id(request_data: DeleteQuestionRequestModel, api_key: str = Depends(get_api_key)):         
     user_id = request_data.user_id
     question_id = request_data.question_id
-    delete_question(user_id, question_id)   
+    await run_db_in_executor(delete_question, user_id, question_id)
     return 'ok'
 
 @app.post("/{version}/dislike")
-def read_history_for_question_id(request_data: DislikeQuestionRequestModel, api_key: str = Depends(get_api_key)):     
+async def read_history_for_question_id(request_data: DislikeQuestionRequestModel, api_key: str = Depends(get_api_key)):     
     dislike = request_data.dislike
     user_id = request_data.user_id
     question_id = request_data.question_id
@@ -588,14 +625,14 @@ def read_history_for_question_id(request_data: DislikeQuestionRequestModel, api_
     if dislike not in [0, 1]:
         raise HTTPException(status_code=404, detail="Invalid value for dislike")
     
-    set_answer_dislike(user_id, question_id, dislike)   
+    await run_db_in_executor(set_answer_dislike, user_id, question_id, dislike)
     return 'ok'
 
 @app.post("/{version}/validate-user")
-def check_user_is_valid(request_data: UserValidationRequestModel):
+async def check_user_is_valid(request_data: UserValidationRequestModel):
     username = request_data.username
     password = request_data.password
-    user_details = get_user_details(username, password)
+    user_details = await run_db_in_executor(get_user_details, username, password)
     user_details["api_key"] = get_api_key_for_user(user_details["user_id"])
     return user_details
 
@@ -603,10 +640,9 @@ def check_user_is_valid(request_data: UserValidationRequestModel):
 @app.get("/{version}/cache-stats")
 def get_cache_stats(api_key: str = Depends(get_api_key)):
     """Get cache statistics for monitoring performance."""
-    cache = get_response_cache()
-    stats = cache.get_stats()
+    stats = RESPONSE_CACHE.get_stats()
     # Cleanup expired entries
-    cleaned = cache.cleanup_expired()
+    cleaned = RESPONSE_CACHE.cleanup_expired()
     stats["cleaned_expired"] = cleaned
     return stats
 
@@ -614,30 +650,37 @@ def get_cache_stats(api_key: str = Depends(get_api_key)):
 @app.post("/{version}/cache-clear")
 def clear_cache(api_key: str = Depends(get_api_key)):
     """Clear all cached responses."""
-    cache = get_response_cache()
-    cache.clear()
+    RESPONSE_CACHE.clear()
     return {"message": "Cache cleared successfully"}
 
 
+@app.post("/{version}/knowledge-base-reload")
+def reload_knowledge_base_prompts(api_key: str = Depends(get_api_key)):
+    """Re-read the knowledge-base JSON files and rebuild the prompts derived from them."""
+    from llm import reload_knowledge_base
+    reload_knowledge_base()
+    return {"message": "Knowledge base reloaded successfully"}
+
+
 @app.post("/{version}/get-chart-img")
-def get_chart_img(request_data: ChartsRequestModel, api_key: str = Depends(get_api_key)):    
+async def get_chart_img(request_data: ChartsRequestModel, api_key: str = Depends(get_api_key)):    
     question_id = request_data.question_id    
     file_id = request_data.file_id 
-    chart_img = api_handlers.get_charts(question_id, file_id)
+    chart_img = await run_in_executor(api_handlers.get_charts, question_id, file_id)
     return chart_img
 
 @app.post("/{version}/edit-chart-img")
-def edit_chart_img(request_data: ChartEditRequestModel, api_key: str = Depends(get_api_key)): 
+async def edit_chart_img(request_data: ChartEditRequestModel, api_key: str = Depends(get_api_key)): 
     question_id = request_data.question_id     
     file_id = request_data.file_id 
     code = request_data.code 
     library = request_data.library 
     instructions = request_data.instructions    
-    chart_img = api_handlers.edit_chart(question_id, file_id, code, library, instructions)   
+    chart_img = await run_in_executor(api_handlers.edit_chart, question_id, file_id, code, library, instructions)
     return chart_img
 
 @app.post("/{version}/get-charts")
-def get_chart(request_data: ChartOptionsRequestModel, version: str, api_key: str = Depends(get_api_key)):
+async def get_chart(request_data: ChartOptionsRequestModel, version: str, api_key: str = Depends(get_api_key)):
     """Generate chart options for a given question's result set"""
     try:
         question_id = str(request_data.question_id)
@@ -647,25 +690,35 @@ def get_chart(request_data: ChartOptionsRequestModel, version: str, api_key: str
 
         # First check if chart already exists in database
         from self_db import get_question_chart_info
-        saved_chart = get_question_chart_info(question_id)
+        saved_chart = await run_db_in_executor(get_question_chart_info, question_id)
         if saved_chart:
             logger.info(f"Chart loaded from database for question_id: {question_id}")
-            # Parse chart_data if it's a string
-            chart_data = saved_chart.get('chart_data', '[]')
-            if isinstance(chart_data, str):
+            # chart_data is stored as JSON text (encoded on save), so it is spliced
+            # into the response as-is instead of being re-encoded; anything that is not
+            # a valid JSON array (legacy rows, NaN/Infinity from old saves) falls back to []
+            chart_data = saved_chart.get('chart_data') or '[]'
+            if not isinstance(chart_data, str):
+                chart_data = orjson.dumps(chart_data).decode()
+            chart_data = chart_data.strip().encode("utf-8")
+            is_valid = chart_data.startswith(b"[")
+            if is_valid:
                 try:
-                    chart_data = json.loads(chart_data)
-                except json.JSONDecodeError:
-                    chart_data = []
-            return {
-                "chart_type": saved_chart['chart_type'],
-                "chart_options": saved_chart['chart_options'],
-                "chart_data": chart_data,
-                "from_cache": True
-            }
+                    orjson.loads(chart_data)
+                except orjson.JSONDecodeError:
+                    is_valid = False
+            if not is_valid:
+                logger.warning(f"Stored chart_data for question_id {question_id} is not a valid JSON array")
+                chart_data = b"[]"
+            body = b"".join((
+                b'{"chart_type":', orjson.dumps(saved_chart['chart_type']),
+                b',"chart_options":', orjson.dumps(saved_chart['chart_options']),
+                b',"chart_data":', chart_data,
+                b',"from_cache":true}'
+            ))
+            return Response(content=body, media_type="application/json")
 
         # Generate chart configuration if not found in database
-        chart_info = api_handlers.get_charts_code(question_id)
+        chart_info = await run_in_executor(api_handlers.get_charts_code, question_id)
 
         # Check if chart generation resulted in an error
         if chart_info.get("chart_type") == "error":
@@ -680,8 +733,8 @@ def get_chart(request_data: ChartOptionsRequestModel, version: str, api_key: str
         try:
             chart_type = chart_info["chart_type"]
             chart_options = chart_info["chart_options"]
-            chart_data = json.dumps(chart_info["chart_data"])
-            update_question_chart_info(question_id, chart_type, chart_options, chart_data)
+            chart_data = orjson.dumps(chart_info["chart_data"]).decode()
+            await run_db_in_executor(update_question_chart_info, question_id, chart_type, chart_options, chart_data)
             logger.info(f"Chart info saved successfully for question_id: {question_id}")
         except (ValueError, KeyError) as e:
             logger.error(f"Error updating chart info for question_id {question_id}: {e}")
@@ -695,17 +748,17 @@ def get_chart(request_data: ChartOptionsRequestModel, version: str, api_key: str
 
 
 @app.post("/{version}/edit-charts")
-def edit_chart(request_data: ChartOptionsEditRequestModel, version: str, api_key: str = Depends(get_api_key)):                 
+async def edit_chart(request_data: ChartOptionsEditRequestModel, version: str, api_key: str = Depends(get_api_key)):                 
     question_id = str(request_data.question_id)   
     user_id = request_data.user_id        
     code = request_data.code
     instructions = request_data.instructions    
-    apex_chart_options = api_handlers.edit_charts_code(question_id, code, instructions)       
+    apex_chart_options = await run_in_executor(api_handlers.edit_charts_code, question_id, code, instructions)
     return apex_chart_options
 
 
 @app.post("/{version}/save-edited-charts")
-def save_edited_chart(request_data: ChartOptionsSaveEditedRequestModel, version: str, api_key: str = Depends(get_api_key)):                 
+async def save_edited_chart(request_data: ChartOptionsSaveEditedRequestModel, version: str, api_key: str = Depends(get_api_key)):                 
     question_id = str(request_data.question_id)   
     user_id = request_data.user_id        
     chart_type = request_data.chart_type
@@ -713,7 +766,7 @@ def save_edited_chart(request_data: ChartOptionsSaveEditedRequestModel, version:
     chart_data = "[]"
     
     try:               
-        update_question_chart_info(question_id, chart_type, chart_options, chart_data)  
+        await run_db_in_executor(update_question_chart_info, question_id, chart_type, chart_options, chart_data)
     except ValueError as e:
         return {"message": "Error while updating question", "error": str(e)}
         
@@ -722,12 +775,28 @@ def save_edited_chart(request_data: ChartOptionsSaveEditedRequestModel, version:
     
     
 #RAG
+UPLOAD_DIR = "data/uploads"
+
+
+def _save_upload(source, path: str) -> None:
+    """Copy an uploaded file to disk in 1 MiB chunks."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(source, buffer, 1 << 20)
+
+
 @app.post("/uploadfile/")
 async def create_upload_file(file: UploadFile):
-    with open(f"/{file.filename}", "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    loader = PyPDFLoader(file.filename)
-    pages = loader.load_and_split()
+    # Keep only the base name so uploads can't escape UPLOAD_DIR
+    filename = os.path.basename(file.filename or "")
+    if not filename:
+        raise HTTPException(status_code=400, detail="Invalid file name")
+    upload_path = os.path.join(UPLOAD_DIR, filename)
+
+    # Disk writes and PDF parsing block, so both run in the executor
+    await run_in_executor(_save_upload, file.file, upload_path)
+    loader = PyPDFLoader(upload_path)
+    pages = await run_in_executor(loader.load_and_split)
 
     len(pages)
     full_document = ""
@@ -768,7 +837,7 @@ def answer_original_question(request_data: QuestionRequestModel):
 
         retrieval_chain = create_retrieval_chain(retriever, document_chain)
         response = retrieval_chain.invoke({"input": question_asked})
-        answered_at = datetime.now().strftime("%B %d, %Y, %H:%M:%S")
+        answered_at = answered_at_now()
         return {"question_id": question_id, "answer": response["answer"], "answered_at": answered_at}
     except Exception as e:
         detail = f"An error occurred: {str(e)}"
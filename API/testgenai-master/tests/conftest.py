@@ -0,0 +1,10 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config reads these at import time; tests never reach the real endpoint
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test-key")
+os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-02-01")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
@@ -0,0 +1,10 @@
+from llm import llm_core
+
+
+def test_get_llm_builds_with_pinned_langchain_openai():
+    llm = llm_core._get_llm("gpt-4")
+
+    assert llm.client._client._client is llm_core._http_client
+    assert llm.async_client._client._client is llm_core._http_async_client
+    # Unknown kwargs would be forwarded to the API as request parameters
+    assert "http_async_client" not in llm.model_kwargs
@@ -0,0 +1,19 @@
+import numpy as np
+
+from llm.response_cache import SemanticResponseCache
+
+
+def _same_embedding(question):
+    # Every question embeds identically, so only the literal check can tell them apart
+    return np.ones((1, 4), dtype="float32") / 2
+
+
+def test_semantic_hit_requires_matching_literals():
+    cache = SemanticResponseCache(threshold=0.9)
+    cache._semantic._embed_fn = _same_embedding
+
+    cache.set("Top 10 customers in 2023", {"sql": "SELECT TOP 10 ... 2023"})
+
+    assert cache.get("Best 10 customers in 2023") == {"sql": "SELECT TOP 10 ... 2023"}
+    assert cache.get("top 20 customers in 2024") is None
+    assert cache.get("Top 10 customers in 2024") is None
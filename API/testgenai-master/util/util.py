@@ -1,5 +1,6 @@
 import re
 import logging
+from functools import lru_cache
 from bs4 import BeautifulSoup
 
 logger = logging.getLogger(__name__)
@@ -15,6 +16,12 @@ def extract_sql_from_code_blocks(text):
         logger.error("Invalid input to extract_sql_from_code_blocks")
         return None
 
+    return _extract_sql_from_text(text)
+
+
+@lru_cache(maxsize=1024)
+def _extract_sql_from_text(text):
+    """Cached extraction - cached LLM responses re-enter here with identical text."""
     # Pattern 1: ```sql ... ```
     pattern1 = r'```sql\s*(.*?)\s*```'
     matches = re.findall(pattern1, text, re.DOTALL | re.IGNORECASE)